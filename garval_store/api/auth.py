@@ -1,6 +1,9 @@
 import frappe
 from frappe import _
 from frappe.utils import random_string, get_url
+from garval_store.settings import get_store_settings
+from garval_store.emails import get_recipient_lang, render_email_template
+from garval_store.outbox import queue_email
 from garval_store.utils import (
     create_customer_from_signup,
     get_email_verified,
@@ -57,8 +60,8 @@ def login(email, password):
                     "doctype": "Customer",
                     "customer_name": full_name,
                     "customer_type": "Individual",
-                    "customer_group": frappe.db.get_single_value("Selling Settings", "customer_group") or "Individual",
-                    "territory": frappe.db.get_single_value("Selling Settings", "territory") or "All Territories",
+                    "customer_group": get_store_settings().customer_group,
+                    "territory": get_store_settings().territory,
                     "email_id": frappe.session.user
                 })
                 customer.insert(ignore_permissions=True)
@@ -201,55 +204,18 @@ def send_verification_email(email, full_name):
     # Build verification URL
     verification_url = get_url(f"/verify-email?key={verification_key}&email={email}")
 
-    # Get current language
-    lang = frappe.local.lang or "es"
-
-    if lang == "es":
-        subject = "Verifica tu cuenta - Finca Garval"
-        message = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #33652B;">Bienvenido a Finca Garval</h2>
-            <p>Hola {full_name},</p>
-            <p>Gracias por registrarte. Por favor, verifica tu correo electrónico haciendo clic en el siguiente enlace:</p>
-            <p style="margin: 30px 0;">
-                <a href="{verification_url}" style="background-color: #33652B; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                    Verificar mi cuenta
-                </a>
-            </p>
-            <p>O copia y pega este enlace en tu navegador:</p>
-            <p style="color: #666; word-break: break-all;">{verification_url}</p>
-            <p>Este enlace expirará en 24 horas.</p>
-            <p>Si no has creado esta cuenta, puedes ignorar este correo.</p>
-            <br>
-            <p>Saludos,<br>El equipo de Finca Garval</p>
-        </div>
-        """
-    else:
-        subject = "Verify your account - Finca Garval"
-        message = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #33652B;">Welcome to Finca Garval</h2>
-            <p>Hello {full_name},</p>
-            <p>Thank you for signing up. Please verify your email by clicking the link below:</p>
-            <p style="margin: 30px 0;">
-                <a href="{verification_url}" style="background-color: #33652B; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                    Verify my account
-                </a>
-            </p>
-            <p>Or copy and paste this link into your browser:</p>
-            <p style="color: #666; word-break: break-all;">{verification_url}</p>
-            <p>This link will expire in 24 hours.</p>
-            <p>If you didn't create this account, you can ignore this email.</p>
-            <br>
-            <p>Best regards,<br>The Finca Garval Team</p>
-        </div>
-        """
-
-    frappe.sendmail(
+    # In the recipient's language, which at signup is the one they browse in
+    lang = get_recipient_lang(email)
+    subject = _("Verify your account - Finca Garval", lang=lang)
+    message = render_email_template("verify_email.html", {
+        "full_name": full_name,
+        "verification_url": verification_url
+    }, lang=lang)
+
+    queue_email(
         recipients=[email],
         subject=subject,
-        message=message,
-        now=True
+        message=message
     )
 
 
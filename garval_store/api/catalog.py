@@ -0,0 +1,97 @@
+import json
+from hashlib import sha1
+
+import frappe
+from frappe.utils import get_url
+from werkzeug.wrappers import Response
+
+# Redis key prefix holding, per price list and language, the item hashes of
+# recent catalog versions so clients can ask for the changes since one of them
+CATALOG_VERSIONS_CACHE_KEY = "garval_catalog_api_versions::"
+
+# Number of catalog versions a delta can be computed from
+CATALOG_VERSIONS_KEPT = 20
+
+
+@frappe.whitelist(allow_guest=True, methods=["GET"])
+def get_catalog(since=None):
+    """Get the published catalog as compact JSON for client side rendering.
+
+    The version is a hash of the content and doubles as a strong ETag, so an
+    unchanged catalog is answered with 304. With `since` set to a recent
+    version only the changed and removed products are returned.
+    """
+    from garval_store.catalog import get_catalog_price_list, get_catalog_products
+    from garval_store.stock import set_stock_status
+    from garval_store.utils import get_lang
+
+    lang = get_lang()
+    price_list = get_catalog_price_list()
+    products = [
+        _get_catalog_entry(product)
+        for product in set_stock_status(get_catalog_products(price_list, lang))
+    ]
+
+    item_hashes = {product["item_code"]: _get_hash(product) for product in products}
+    version = _get_hash(sorted(item_hashes.items()))
+    previous_hashes = _remember_version(f"{price_list}::{lang}", version, item_hashes, since)
+
+    etag = f'"{version}-{since}"' if previous_hashes is not None else f'"{version}"'
+    response = Response(content_type="application/json")
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "public, no-cache"
+    response.headers["Vary"] = "Cookie"
+
+    if etag in (frappe.get_request_header("If-None-Match") or ""):
+        response.status_code = 304
+        return response
+
+    data = {"version": version, "lang": lang}
+    if previous_hashes is not None:
+        data["delta"] = 1
+        data["products"] = [
+            product for product in products
+            if previous_hashes.get(product["item_code"]) != item_hashes[product["item_code"]]
+        ]
+        data["removed"] = [item_code for item_code in previous_hashes if item_code not in item_hashes]
+    else:
+        data["delta"] = 0
+        data["products"] = products
+
+    response.set_data(json.dumps(data, separators=(",", ":")))
+    return response
+
+
+def _get_catalog_entry(product):
+    image = product.image
+    if image and not image.startswith("http"):
+        image = get_url(image)
+
+    return {
+        "item_code": product.item_code,
+        "name": product.name,
+        "slug": product.slug,
+        "image": image,
+        "price": product.price,
+        "in_stock": 0 if product.out_of_stock else 1
+    }
+
+
+def _get_hash(data):
+    return sha1(json.dumps(data, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+
+
+def _remember_version(key, version, item_hashes, since=None):
+    """Store the item hashes of `version` and return those of `since` if still known"""
+    cache_key = f"{CATALOG_VERSIONS_CACHE_KEY}{key}"
+    versions = frappe.cache().get_value(cache_key) or {}
+
+    if version not in versions:
+        versions[version] = item_hashes
+        while len(versions) > CATALOG_VERSIONS_KEPT:
+            versions.pop(next(iter(versions)))
+        frappe.cache().set_value(cache_key, versions)
+
+    if since:
+        return versions.get(since)
+    return None
@@ -1,15 +1,31 @@
+import json
+
 import frappe
 from frappe import _
 from garval_store.utils import get_email_verified
+from garval_store.outbox import queue_email
+from frappe.utils import flt
 from webshop.webshop.shopping_cart.cart import (
-    update_cart,
-    update_cart_address,
+    _get_cart_quotation,
+    apply_cart_settings,
     place_order
 )
 
+# Redis key prefix for checkout idempotency keys, per user
+ORDER_IDEMPOTENCY_CACHE_KEY_PREFIX = "garval_checkout_idempotency::"
+
+# How long a running checkout holds its key, and how long results are kept
+ORDER_IN_FLIGHT_TTL = 120
+ORDER_RESULT_TTL = 24 * 60 * 60
+
 @frappe.whitelist()
-def create_order(customer_info, items):
-    """Create Sales Order using webshop's place_order functionality"""
+def create_order(customer_info, items, idempotency_key=None):
+    """Create Sales Order using webshop's place_order functionality.
+
+    Requests sharing an `idempotency_key` place the order once: a duplicate
+    that arrives while the first is running gets `pending` and polls again,
+    later ones get the stored result.
+    """
     if frappe.session.user == "Guest":
         frappe.throw(_("Please login to place an order"), frappe.AuthenticationError)
     
@@ -20,19 +36,39 @@ def create_order(customer_info, items):
                 _("Please verify your email address before placing an order. Check your inbox for the verification link."),
                 frappe.AuthenticationError
             )
-    
+
+    if not idempotency_key:
+        return _place_cart_order(customer_info, items)
+
+    cache = frappe.cache()
+    cache_key = cache.make_key(f"{ORDER_IDEMPOTENCY_CACHE_KEY_PREFIX}{frappe.session.user}::{idempotency_key}")
+
+    # Single flight: only the request that claims the key places the order
+    if not cache.set(cache_key, json.dumps({"in_flight": True}), nx=True, ex=ORDER_IN_FLIGHT_TTL):
+        return _get_order_result(cache_key)
+
+    result = _place_cart_order(customer_info, items)
+    if result.get("success"):
+        # Published once the Sales Order is committed
+        frappe.db.after_commit.add(
+            lambda: cache.set(cache_key, json.dumps(result), ex=ORDER_RESULT_TTL)
+        )
+    else:
+        # Nothing was placed, so free the key: the client keeps it until an order
+        # succeeds, and a resubmit after fixing the cart must run again. Polling
+        # duplicates run again too, and the stock hold keeps them from overselling.
+        cache.delete(cache_key)
+
+    return result
+
+
+def _place_cart_order(customer_info, items):
+    from garval_store.reservations import release_stock_hold, reserve_stock
+
     try:
-        for item in items:
-            item_code = item.get("id") or item.get("item_code")
-            qty = item.get("quantity", 1)
-            if item_code:
-                update_cart(item_code=item_code, qty=qty, with_items=False)
-
-        if customer_info.get("selected_address"):
-            update_cart_address(
-                address_type="shipping",
-                address_name=customer_info.get("selected_address")
-            )
+        # Holds the cart's stock until the submitted Sales Order reserves it in Bin
+        reserve_stock(items)
+        apply_cart(items, shipping_address=customer_info.get("selected_address"))
 
         sales_order_name = place_order()
         return {
@@ -43,6 +79,8 @@ def create_order(customer_info, items):
     except Exception as e:
         frappe.log_error(f"Create order error: {str(e)}")
         frappe.db.rollback()
+        # No order will reserve the held units, so give them back now
+        release_stock_hold(frappe.session.user)
         error_message = str(e)
         
         if "Not in Stock" in error_message:
@@ -53,91 +91,200 @@ def create_order(customer_info, items):
             "error": error_message or _("Failed to process order. Please try again.")
         }
 
-def send_order_confirmation(order_id, email):
-    """Send order confirmation email"""
+
+def _get_order_result(cache_key):
+    """Get the result of the request holding the idempotency key, without waiting for it"""
+    value = frappe.cache().get(cache_key)
+    state = json.loads(value) if value else None
+    if state and not state.get("in_flight"):
+        return state
+
+    if state:
+        # Still running; the client asks again shortly
+        return {
+            "success": False,
+            "pending": True,
+            "error": _("Your order is being processed.")
+        }
+
+    # The first request died; let the client check its orders before retrying
+    return {
+        "success": False,
+        "error": _("Your order is still being processed. Please check your orders before trying again.")
+    }
+
+
+@frappe.whitelist(allow_guest=True)
+def reconcile_cart(items):
+    """Check the whole client cart in one call.
+
+    Returns, per line, the server price, whether it can be ordered and the
+    quantity it can be ordered in, using the same rules as checkout.
+    """
+    from garval_store.utils import MAX_QUANTITY_PER_ITEM, validate_cart_items
+
     try:
-        from frappe.utils import fmt_money
-        
-        order = frappe.get_doc("Sales Order", order_id)
+        items = frappe.parse_json(items) if isinstance(items, str) else items
+        lines = validate_cart_items(items or [])
 
-        subject = _("Order Confirmation - {0}").format(order_id)
+        return {
+            "success": True,
+            "max_quantity": MAX_QUANTITY_PER_ITEM,
+            "items": [
+                {
+                    "item_code": line.item_code,
+                    "item_name": line.item_name,
+                    "price": line.price,
+                    "formatted_price": line.formatted_price,
+                    "available": bool(line.max_qty and line.price > 0),
+                    "qty": min(max(int(line.qty), 1), line.max_qty),
+                    "max_qty": line.max_qty,
+                    "error": line.error
+                }
+                for line in lines
+            ]
+        }
 
-        message = f"""
-        <h2>{_('Thank you for your order!')}</h2>
-        <p>{_('Your order')} <strong>{order_id}</strong> {_('has been received.')}</p>
+    except Exception as e:
+        frappe.log_error(f"Cart reconciliation error: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
 
-        <h3>{_('Order Details')}</h3>
-        <table style="width: 100%; border-collapse: collapse;">
-            <tr style="background: #f5f5f5;">
-                <th style="padding: 10px; text-align: left;">{_('Product')}</th>
-                <th style="padding: 10px; text-align: right;">{_('Qty')}</th>
-                <th style="padding: 10px; text-align: right;">{_('Price')}</th>
-            </tr>
-        """
 
-        for item in order.items:
-            message += f"""
-            <tr>
-                <td style="padding: 10px; border-bottom: 1px solid #ddd;">{item.item_name}</td>
-                <td style="padding: 10px; border-bottom: 1px solid #ddd; text-align: right;">{item.qty}</td>
-                <td style="padding: 10px; border-bottom: 1px solid #ddd; text-align: right;">{fmt_money(item.amount, currency=order.currency)}</td>
-            </tr>
-            """
+@frappe.whitelist(methods=["POST"])
+def reserve_cart(items):
+    """Hold the cart's stock while the customer checks out.
 
-        message += f"""
-        </table>
+    Holds expire on their own, so an abandoned checkout gives its units back.
+    """
+    from garval_store.reservations import STOCK_HOLD_TTL, reserve_stock
 
-        <p style="margin-top: 20px; font-size: 18px;">
-            <strong>{_('Total')}: {fmt_money(order.grand_total, currency=order.currency)}</strong>
-        </p>
+    if frappe.session.user == "Guest":
+        frappe.throw(_("Please login to place an order"), frappe.AuthenticationError)
+
+    try:
+        items = frappe.parse_json(items) if isinstance(items, str) else items
+        reserve_stock(items or [])
+
+        return {
+            "success": True,
+            "expires_in": STOCK_HOLD_TTL
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def apply_cart(items, shipping_address=None):
+    """Set the cart Quotation's lines and shipping address in memory and save it once.
+
+    Does what webshop's update_cart (per item) and update_cart_address do, but
+    prices, taxes and shipping rules are applied a single time. The lines are
+    replaced by `items`, so the order matches the cart the customer checked out.
+    """
+    from frappe.contacts.doctype.address.address import get_address_display
+
+    quotation = _get_cart_quotation()
+
+    quantities = {}
+    for item in items:
+        item_code = item.get("id") or item.get("item_code")
+        qty = flt(item.get("quantity", 1))
+        if item_code and qty > 0:
+            quantities[item_code] = quantities.get(item_code, 0) + qty
+
+    if not quantities:
+        frappe.throw(_("Your cart is empty"))
 
-        <p>{_('We will notify you when your order ships.')}</p>
+    warehouses = dict(frappe.get_all(
+        "Website Item",
+        filters={"item_code": ["in", list(quantities)]},
+        fields=["item_code", "website_warehouse"],
+        as_list=True
+    ))
 
-        <p>{_('Best regards,')}<br>Finca Garval</p>
-        """
+    existing = {row.item_code: row for row in quotation.get("items")}
+    quotation.set("items", [])
+    for item_code, qty in quantities.items():
+        row = existing.get(item_code)
+        if row:
+            row.qty = qty
+            row.warehouse = warehouses.get(item_code)
+            quotation.append("items", row)
+        else:
+            quotation.append("items", {
+                "doctype": "Quotation Item",
+                "item_code": item_code,
+                "qty": qty,
+                "warehouse": warehouses.get(item_code)
+            })
 
-        frappe.sendmail(
+    if shipping_address:
+        if not frappe.db.exists("Dynamic Link", {
+            "parenttype": "Address",
+            "parent": shipping_address,
+            "link_doctype": "Customer",
+            "link_name": quotation.party_name
+        }):
+            frappe.throw(_("Invalid shipping address"))
+
+        quotation.shipping_address_name = shipping_address
+        quotation.shipping_address = get_address_display(frappe.get_doc("Address", shipping_address).as_dict())
+        quotation.customer_address = quotation.customer_address or shipping_address
+
+    apply_cart_settings(quotation=quotation)
+    quotation.flags.ignore_permissions = True
+    quotation.payment_schedule = []
+    quotation.save()
+
+    return quotation
+
+def send_order_confirmation(order_id, email):
+    """Send order confirmation email"""
+    try:
+        from garval_store.currency import get_currency_formatter
+        from garval_store.emails import get_recipient_lang, render_email_template
+
+        order = frappe.get_doc("Sales Order", order_id)
+        lang = get_recipient_lang(email)
+        formatter = get_currency_formatter(currency=order.currency, lang=lang)
+
+        subject = _("Order Confirmation - {0}", lang=lang).format(order_id)
+        message = render_email_template("order_confirmation.html", {
+            "order": order,
+            "format_currency": formatter.format
+        }, lang=lang)
+
+        queue_email(
             recipients=[email],
             subject=subject,
             message=message,
-            now=True
+            reference_doctype="Sales Order",
+            reference_name=order_id,
+            dedupe_key=f"order_confirmation::{order_id}",
+            dedupe_ttl=ORDER_RESULT_TTL
         )
 
     except Exception as e:
         frappe.log_error(f"Order email error: {str(e)}")
 
 @frappe.whitelist(allow_guest=True)
-def get_shipping_rates(country, postal_code=None):
-    """Get shipping rates based on location"""
+def get_shipping_rates(country, postal_code=None, items=None):
+    """Get shipping rates for the cart from the shipping zone of the address"""
     try:
-        # Simple shipping logic - can be extended
-        shipping_rates = {
-            "Spain": {"standard": 0, "express": 5.99},  # Free shipping in Spain
-            "Portugal": {"standard": 4.99, "express": 9.99},
-            "France": {"standard": 7.99, "express": 14.99},
-            "Germany": {"standard": 9.99, "express": 17.99},
-            "Italy": {"standard": 9.99, "express": 17.99},
-            "default": {"standard": 14.99, "express": 24.99}
-        }
+        from garval_store.shipping import get_shipping_rates_for_cart
 
-        rates = shipping_rates.get(country, shipping_rates["default"])
+        if isinstance(items, str):
+            items = json.loads(items)
 
         return {
             "success": True,
-            "rates": [
-                {
-                    "id": "standard",
-                    "name": _("Standard Shipping"),
-                    "price": rates["standard"],
-                    "days": "5-7"
-                },
-                {
-                    "id": "express",
-                    "name": _("Express Shipping"),
-                    "price": rates["express"],
-                    "days": "2-3"
-                }
-            ]
+            "rates": get_shipping_rates_for_cart(country, postal_code, items)
         }
 
     except Exception as e:
@@ -148,20 +295,17 @@ def get_shipping_rates(country, postal_code=None):
 
 @frappe.whitelist()
 def calculate_taxes(subtotal):
-    """Calculate taxes using webshop's cart system"""
+    """Calculate taxes for the checkout summary from the compiled tax template rules"""
     try:
-        from webshop.webshop.shopping_cart.cart import get_cart_quotation
-        
-        # Get cart quotation which has taxes calculated
-        cart_data = get_cart_quotation()
-        quotation = cart_data.get("doc", {})
-        
+        from garval_store.settings import get_store_settings
+        from garval_store.utils import calculate_taxes_and_charges
+
+        settings = get_store_settings()
+
         return {
             "success": True,
-            "subtotal": quotation.get("net_total", 0),
-            "taxes": quotation.get("total_taxes_and_charges", 0),
-            "grand_total": quotation.get("grand_total", 0),
-            "currency": quotation.get("currency")
+            **calculate_taxes_and_charges(flt(subtotal), company=settings.company),
+            "currency": settings.currency
         }
     except Exception as e:
         frappe.log_error(f"Calculate taxes error: {str(e)}")
@@ -1,5 +1,6 @@
 import frappe
 from frappe import _
+from garval_store.outbox import queue_email
 
 @frappe.whitelist(allow_guest=True)
 def submit(full_name, email, subject, message, phone=None):
@@ -17,7 +18,8 @@ def submit(full_name, email, subject, message, phone=None):
         admin_email = None
         try:
             # Get default company
-            default_company = frappe.db.get_single_value("Global Defaults", "default_company")
+            from garval_store.settings import get_store_settings
+            default_company = get_store_settings().company
             
             if default_company:
                 # Try to get company email first
@@ -32,7 +34,7 @@ def submit(full_name, email, subject, message, phone=None):
         # Send notification email to admin
         if admin_email:
             try:
-                frappe.sendmail(
+                queue_email(
                     recipients=[admin_email],
                     subject=f"[Finca Garval] New Contact Form: {subject}",
                     message=f"""
@@ -42,8 +44,7 @@ def submit(full_name, email, subject, message, phone=None):
                         <p><strong>Subject:</strong> {subject}</p>
                         <hr>
                         <p>{message}</p>
-                    """,
-                    now=True
+                    """
                 )
             except Exception as email_error:
                 # Log but don't fail if notification email fails
@@ -51,7 +52,7 @@ def submit(full_name, email, subject, message, phone=None):
 
         # Send confirmation to sender
         try:
-            frappe.sendmail(
+            queue_email(
                 recipients=[email],
                 subject=_("We received your message - Finca Garval"),
                 message=f"""
@@ -62,8 +63,7 @@ def submit(full_name, email, subject, message, phone=None):
                         {message}
                     </blockquote>
                     <p>{_('Best regards,')}<br>Finca Garval</p>
-                """,
-                now=True
+                """
             )
         except Exception as email_error:
             # Log but don't fail if confirmation email fails
@@ -144,3 +144,37 @@ def cancel_order(order_id):
     except Exception as e:
         frappe.log_error(f"Error cancelling order: {str(e)}\nOrder: {order_id}\nTraceback: {frappe.get_traceback()}", "Cancel Order Error")
         return {"success": False, "error": _("Failed to cancel order. Please try again or contact support.")}
+
+
+@frappe.whitelist(allow_guest=False, methods=["GET"])
+def download_invoice(order_id):
+    """Download the PDF of the latest submitted Sales Invoice of an order.
+
+    Served from the invoice PDF cache, so it is only rendered on first download
+    or after the invoice changes.
+    """
+    from garval_store.invoice_pdf import get_invoice_pdf
+    from garval_store.utils import get_lang
+
+    customer = get_customer_from_user()
+    if not customer or frappe.db.get_value("Sales Order", order_id, "customer") != customer:
+        raise frappe.PermissionError(_("You don't have permission to access this order"))
+
+    invoices = frappe.get_all(
+        "Sales Invoice Item",
+        filters={"sales_order": order_id, "docstatus": 1},
+        pluck="parent",
+        distinct=True
+    )
+    invoice = invoices and frappe.db.get_value(
+        "Sales Invoice",
+        {"name": ["in", invoices], "docstatus": 1},
+        "name",
+        order_by="posting_date desc, creation desc"
+    )
+    if not invoice:
+        frappe.throw(_("No invoice found for this order"), frappe.DoesNotExistError)
+
+    frappe.local.response.filename = f"{invoice}.pdf"
+    frappe.local.response.filecontent = get_invoice_pdf("Sales Invoice", invoice, lang=get_lang())
+    frappe.local.response.type = "pdf"
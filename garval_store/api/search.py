@@ -0,0 +1,72 @@
+import frappe
+from frappe.utils import cint
+
+
+@frappe.whitelist(allow_guest=True)
+def search(q, limit=20):
+    """Search published products by name and description (Spanish and English)"""
+    try:
+        from garval_store.catalog import get_catalog_products
+        from garval_store.search import search_products
+        from garval_store.stock import set_stock_status
+        from garval_store.utils import set_lang
+
+        lang = set_lang()
+        item_codes = search_products(q, limit=min(cint(limit) or 20, 100))
+
+        products_by_code = {p.item_code: p for p in get_catalog_products(lang=lang)}
+        products = set_stock_status([products_by_code[code] for code in item_codes if code in products_by_code])
+
+        return {
+            "success": True,
+            "products": [
+                {
+                    "item_code": p.item_code,
+                    "name": p.name,
+                    "slug": p.slug,
+                    "image": p.image,
+                    "price": p.price,
+                    "formatted_price": p.formatted_price,
+                    "out_of_stock": p.out_of_stock
+                }
+                for p in products
+            ]
+        }
+
+    except Exception as e:
+        frappe.log_error(f"Product search error: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+@frappe.whitelist(allow_guest=True, methods=["GET"])
+def typeahead(prefix, limit=5):
+    """Suggest products and categories for a typed prefix.
+
+    Served from the in-memory typeahead index with an ETag, so repeated
+    keystrokes are answered with 304 by the browser cache.
+    """
+    from hashlib import md5
+    from werkzeug.wrappers import Response
+    from garval_store.typeahead import get_suggestions, get_typeahead_index
+    from garval_store.utils import get_lang
+
+    lang = get_lang()
+    limit = min(cint(limit) or 5, 10)
+    version = get_typeahead_index().version
+    key = f"{version}::{lang}::{limit}::{(prefix or '').strip().lower()}"
+    etag = '"{0}"'.format(md5(key.encode()).hexdigest())
+
+    response = Response(content_type="application/json")
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "public, max-age=60"
+    response.headers["Vary"] = "Cookie"
+
+    if etag in (frappe.get_request_header("If-None-Match") or ""):
+        response.status_code = 304
+        return response
+
+    response.set_data(frappe.as_json(get_suggestions(prefix, lang=lang, limit=limit), indent=None, separators=(",", ":")))
+    return response
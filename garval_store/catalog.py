@@ -0,0 +1,294 @@
+import frappe
+from frappe.utils import cint, flt
+from garval_store.page_cache import clear_page_cache
+from garval_store.stock import clear_stock_cache
+
+# Redis hash holding the formatted catalog, one field per price list and language
+CATALOG_SNAPSHOT_CACHE_KEY = "garval_catalog_snapshot"
+
+# Sort keys accepted by the shop page mapped to their ORDER BY clause
+CATALOG_SORT_ORDERS = {
+    "newest": "wi.ranking desc, wi.creation desc",
+    "price_low": "ip.price_list_rate is null, ip.price_list_rate asc, wi.name asc",
+    "price_high": "ip.price_list_rate is null, ip.price_list_rate desc, wi.name asc",
+    "name": "coalesce(nullif(wi.web_item_name, ''), wi.item_name) asc, wi.name asc",
+}
+
+# Item Price can hold several rows per item (UOMs, customer specific rates),
+# so it is collapsed to one generic selling rate per item before joining
+ITEM_PRICE_SUBQUERY = """
+    select item_code, min(price_list_rate) as price_list_rate
+    from `tabItem Price`
+    where price_list = %(price_list)s
+        and selling = 1
+        and ifnull(customer, '') = ''
+        and (valid_from is null or valid_from <= curdate())
+        and (valid_upto is null or valid_upto >= curdate())
+    group by item_code
+"""
+
+
+def get_catalog_price_list():
+    """Get the selling price list used by the webshop"""
+    from garval_store.settings import get_store_settings
+
+    return get_store_settings().price_list
+
+
+def get_catalog_page(item_group=None, price_min=None, price_max=None, sort="newest", start=0, page_length=20, item_codes=None):
+    """Get one page of published Website Items with price filtering and sorting done in SQL.
+
+    `item_codes` optionally restricts the page to a preselected set of items,
+    e.g. the result of a facet search. With sort "relevance" the page keeps
+    the order of `item_codes`.
+
+    Returns a dict with the raw rows in `items` and the filtered total in `items_count`.
+    """
+    if item_codes is not None and not item_codes:
+        return {"items": [], "items_count": 0}
+
+    price_list = get_catalog_price_list()
+    conditions, values = _get_catalog_conditions(price_list, item_group, price_min, price_max, item_codes)
+    values.update({"start": cint(start), "page_length": cint(page_length) or 20})
+
+    if sort == "relevance" and item_codes:
+        placeholders = []
+        for i, item_code in enumerate(item_codes):
+            values[f"relevance_{i}"] = item_code
+            placeholders.append(f"%(relevance_{i})s")
+        order_by = f"field(wi.item_code, {', '.join(placeholders)})"
+    else:
+        order_by = CATALOG_SORT_ORDERS.get(sort) or CATALOG_SORT_ORDERS["newest"]
+
+    items = _query_catalog(
+        price_list,
+        conditions,
+        values,
+        order_by=order_by,
+        limit="limit %(page_length)s offset %(start)s",
+    )
+
+    if items:
+        items_count = cint(items[0].items_count)
+    elif cint(start):
+        # Past the last page the window count is not available, ask for it directly
+        items_count = get_catalog_count(item_group, price_min, price_max, item_codes)
+    else:
+        items_count = 0
+
+    return {"items": items, "items_count": items_count}
+
+
+def get_catalog_count(item_group=None, price_min=None, price_max=None, item_codes=None):
+    """Count published Website Items matching the catalog filters"""
+    if item_codes is not None and not item_codes:
+        return 0
+
+    conditions, values = _get_catalog_conditions(get_catalog_price_list(), item_group, price_min, price_max, item_codes)
+
+    result = frappe.db.sql(
+        f"""
+        select count(*)
+        from `tabWebsite Item` wi
+        left join ({ITEM_PRICE_SUBQUERY}) ip on ip.item_code = wi.item_code
+        where {conditions}
+        """,
+        values,
+    )
+    return cint(result[0][0]) if result else 0
+
+
+def get_catalog_products(price_list=None, lang=None):
+    """Get every published product, formatted for the storefront, from the shared snapshot.
+
+    The snapshot is built on first use and kept up to date by `on_catalog_change`.
+    """
+    price_list = price_list or get_catalog_price_list()
+    lang = lang or frappe.local.lang or "es"
+    key = f"{price_list}::{lang}"
+
+    products = frappe.cache().hget(CATALOG_SNAPSHOT_CACHE_KEY, key)
+    if products is None:
+        products = [format_catalog_product(row) for row in get_catalog_rows(price_list, lang=lang)]
+        frappe.cache().hset(CATALOG_SNAPSHOT_CACHE_KEY, key, products)
+
+    return products
+
+
+def get_catalog_rows(price_list, item_codes=None, lang=None):
+    """Get the raw catalog rows for all published items, or only for `item_codes`"""
+    conditions, values = _get_catalog_conditions(price_list, item_codes=item_codes or None)
+
+    return _query_catalog(price_list, conditions, values, order_by=CATALOG_SORT_ORDERS["newest"], lang=lang)
+
+
+def format_catalog_product(item):
+    """Format a catalog row into the product dict used by the templates"""
+    # Check stock status - in_stock is 0 (out) or 1 (in stock)
+    in_stock = item.get("in_stock")
+    if in_stock is None:
+        is_stock_item = item.get("is_stock_item", False)
+        out_of_stock = bool(is_stock_item and item.get("stock_qty", 0) == 0)
+    else:
+        out_of_stock = not bool(in_stock)
+
+    return frappe._dict({
+        "item_code": item.get("item_code"),
+        "name": item.get("web_item_name") or item.get("item_name"),
+        "item_name": item.get("item_name"),
+        "item_group": item.get("item_group"),
+        "slug": item.get("route") or item.get("item_code"),
+        "image": item.get("website_image") or item.get("image"),
+        "description": item.get("short_description") or item.get("description"),
+        "price": item.get("price_list_rate") or 0,
+        "formatted_price": item.get("formatted_price") or "€0.00",
+        "out_of_stock": out_of_stock,
+        "warehouse": item.get("website_warehouse"),
+        "ranking": cint(item.get("ranking")),
+        "creation": str(item.get("creation") or ""),
+    })
+
+
+def update_catalog_snapshot(item_codes):
+    """Refresh the given items in every cached catalog snapshot"""
+    item_codes = set(item_codes or [])
+    if not item_codes:
+        return
+
+    cache = frappe.cache()
+    for key in cache.hkeys(CATALOG_SNAPSHOT_CACHE_KEY) or []:
+        key = frappe.safe_decode(key)
+        products = cache.hget(CATALOG_SNAPSHOT_CACHE_KEY, key)
+        if products is None:
+            continue
+
+        try:
+            price_list, lang = key.split("::", 1)
+            fresh = [format_catalog_product(row) for row in get_catalog_rows(price_list, item_codes, lang=lang)]
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), "Catalog Snapshot Update Error")
+            cache.hdel(CATALOG_SNAPSHOT_CACHE_KEY, key)
+            continue
+
+        # Items that are no longer published simply drop out of the snapshot
+        products = [p for p in products if p.item_code not in item_codes] + fresh
+        products.sort(key=lambda p: (p.ranking, p.creation), reverse=True)
+        cache.hset(CATALOG_SNAPSHOT_CACHE_KEY, key, products)
+
+
+def clear_catalog_snapshot(*args, **kwargs):
+    """Drop every cached catalog snapshot and the indexes and guest pages built from it"""
+    from garval_store.facets import clear_facet_index
+
+    frappe.cache().delete_value(CATALOG_SNAPSHOT_CACHE_KEY)
+    clear_facet_index()
+    clear_page_cache()
+
+
+def on_catalog_change(doc, method=None):
+    """doc_events handler for Website Item, Item, Item Price and Bin.
+
+    Changed item codes are collected for the transaction and the snapshot is
+    patched after commit, so a bulk update refreshes each item only once.
+    """
+    item_code = doc.name if doc.doctype == "Item" else doc.get("item_code")
+    if not item_code:
+        return
+
+    if doc.doctype == "Item Price" and not doc.get("selling"):
+        return
+
+    pending = getattr(frappe.local, "garval_catalog_changes", None)
+    if pending is None:
+        pending = frappe.local.garval_catalog_changes = set()
+        frappe.db.after_commit.add(_flush_catalog_changes)
+        frappe.db.after_rollback.add(_discard_catalog_changes)
+    pending.add(item_code)
+
+
+def on_catalog_rename(doc, method=None, old_name=None, new_name=None, merge=False):
+    """Renaming an Item or Website Item changes keys all over the snapshot, rebuild it"""
+    frappe.db.after_commit.add(clear_catalog_snapshot)
+
+
+def _flush_catalog_changes():
+    from garval_store.facets import update_facet_index
+
+    item_codes = _discard_catalog_changes()
+    if item_codes:
+        clear_stock_cache(item_codes)
+        update_catalog_snapshot(item_codes)
+        update_facet_index(item_codes)
+        clear_page_cache()
+
+
+def _discard_catalog_changes():
+    item_codes = getattr(frappe.local, "garval_catalog_changes", None)
+    frappe.local.garval_catalog_changes = None
+    return item_codes
+
+
+def _query_catalog(price_list, conditions, values, order_by, limit="", lang=None):
+    """Run the catalog query and attach stock and formatted price to each row"""
+    items = frappe.db.sql(
+        f"""
+        select
+            wi.name, wi.item_code, wi.web_item_name, wi.item_name, wi.route,
+            wi.website_image, wi.image, wi.short_description, wi.item_group,
+            wi.website_warehouse, wi.ranking, wi.creation, i.is_stock_item,
+            ip.price_list_rate,
+            ifnull(b.actual_qty, 0) - ifnull(b.reserved_qty, 0) as stock_qty,
+            count(*) over () as items_count
+        from `tabWebsite Item` wi
+        inner join `tabItem` i on i.name = wi.item_code
+        left join ({ITEM_PRICE_SUBQUERY}) ip on ip.item_code = wi.item_code
+        left join `tabBin` b on b.item_code = wi.item_code and b.warehouse = wi.website_warehouse
+        where {conditions}
+        order by {order_by}
+        {limit}
+        """,
+        values,
+        as_dict=True,
+    )
+
+    from garval_store.currency import get_currency_formatter
+    from garval_store.pricing import get_price_list_currency
+
+    formatter = get_currency_formatter(currency=get_price_list_currency(price_list), lang=lang)
+    for item in items:
+        item.in_stock = 0 if (item.is_stock_item and item.website_warehouse and item.stock_qty <= 0) else 1
+
+    priced = [item for item in items if item.price_list_rate is not None]
+    for item, formatted_price in zip(priced, formatter.format_many(item.price_list_rate for item in priced)):
+        item.formatted_price = formatted_price
+
+    return items
+
+
+def _get_catalog_conditions(price_list, item_group=None, price_min=None, price_max=None, item_codes=None):
+    """Build the WHERE clause and query values shared by the catalog queries"""
+    conditions = ["wi.published = 1"]
+    values = {"price_list": price_list}
+
+    if item_codes is not None:
+        # An empty preselection (e.g. a search without results) matches nothing
+        conditions.append("wi.item_code in %(item_codes)s" if item_codes else "1 = 0")
+        values["item_codes"] = tuple(item_codes)
+
+    if item_group:
+        conditions.append("wi.item_group = %(item_group)s")
+        values["item_group"] = item_group
+
+    if price_min not in (None, "") or price_max not in (None, ""):
+        # Unpriced items are in no price range, as in the facet index
+        conditions.append("ip.price_list_rate > 0")
+
+    if price_min not in (None, ""):
+        conditions.append("ip.price_list_rate >= %(price_min)s")
+        values["price_min"] = flt(price_min)
+
+    if price_max not in (None, ""):
+        conditions.append("ip.price_list_rate <= %(price_max)s")
+        values["price_max"] = flt(price_max)
+
+    return " and ".join(conditions), values
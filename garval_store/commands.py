@@ -0,0 +1,40 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("garval-build-images")
+@click.option("--force", is_flag=True, default=False, help="Regenerate derivatives that already exist")
+@pass_context
+def build_images_command(context, force=False):
+    """Generate responsive image derivatives for static and Website Item images"""
+    import frappe
+    from garval_store.images import backfill_derivatives
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        count = backfill_derivatives(force=force)
+        click.echo(f"Processed {count} images")
+    finally:
+        frappe.destroy()
+
+
+@click.command("garval-build-critical-css")
+@pass_context
+def build_critical_css_command(context):
+    """Extract the above the fold CSS of each storefront page"""
+    import frappe
+    from garval_store.critical_css import build_critical_css
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        for page, size in build_critical_css().items():
+            click.echo(f"{page}: {size} bytes")
+    finally:
+        frappe.destroy()
+
+
+commands = [build_images_command, build_critical_css_command]
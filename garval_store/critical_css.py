@@ -0,0 +1,247 @@
+import os
+import re
+
+import frappe
+from markupsafe import Markup
+
+# Redis hash caching the extracted CSS per page, loaded from disk on first use
+CRITICAL_CSS_CACHE_KEY = "garval_critical_css"
+
+# Folder under the site's private files holding the extracted CSS
+CRITICAL_CSS_FOLDER = "garval_critical_css"
+
+# Pages the critical CSS is extracted for, as page key -> route rendered
+CRITICAL_CSS_PAGES = {
+    "home": "home",
+    "shop": "shop",
+    "product": None,  # the first published product
+    "cart": "cart",
+    "checkout": "checkout",
+    "my_account": "my-account",
+    "customer_login": "customer-login",
+    "about": "about",
+    "contact": "contact",
+    "aviso_legal": "aviso_legal",
+    "politica_privacidad": "politica_privacidad",
+    "politica_cookies": "politica_cookies",
+    "declaracion_accesibilidad": "declaracion_accesibilidad",
+}
+
+# Used for pages without their own extract, e.g. when a page needs a login to render
+DEFAULT_PAGE = "default"
+
+# Children of <main> rendered above the fold on a phone, besides the navbar
+ABOVE_THE_FOLD_SECTIONS = 2
+
+# Rules that only apply on interaction are not needed for the first paint
+INTERACTIVE_PSEUDO_CLASSES = re.compile(r":(hover|focus|focus-within|focus-visible|active|visited|checked|disabled)\b")
+
+
+def get_critical_css(path=None):
+    """Jinja helper: get the critical CSS of the current page, or None if not built"""
+    page = get_page_key(path)
+
+    cache = frappe.cache()
+    pages = cache.hget(CRITICAL_CSS_CACHE_KEY, "pages")
+    if pages is None:
+        pages = {}
+        folder = frappe.get_site_path("private", CRITICAL_CSS_FOLDER)
+        if os.path.isdir(folder):
+            for filename in os.listdir(folder):
+                if filename.endswith(".css"):
+                    with open(os.path.join(folder, filename)) as f:
+                        pages[filename[:-len(".css")]] = f.read()
+        cache.hset(CRITICAL_CSS_CACHE_KEY, "pages", pages)
+
+    css = pages.get(page) or pages.get(DEFAULT_PAGE)
+    return Markup(css) if css else None
+
+
+def get_page_key(path=None):
+    """Map a request path to its key in CRITICAL_CSS_PAGES"""
+    if path is None:
+        path = frappe.request.path if getattr(frappe.local, "request", None) else ""
+
+    page = (path or "").strip("/").split("/", 1)[0].replace("-", "_") or "home"
+    return page if page in CRITICAL_CSS_PAGES else DEFAULT_PAGE
+
+
+def build_critical_css():
+    """Render every page in CRITICAL_CSS_PAGES as Guest and store the CSS its first screen uses.
+
+    Returns {page: size in bytes} of what was written.
+    """
+    from frappe.utils import set_request
+    from frappe.website.serve import get_response
+
+    with open(frappe.get_app_path("garval_store", "public", "css", "garval.bundle.css")) as f:
+        rules = parse_css(f.read())
+
+    folder = frappe.get_site_path("private", CRITICAL_CSS_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+
+    frappe.set_user("Guest")
+    default_usage = None
+    written = {}
+
+    for page, route in CRITICAL_CSS_PAGES.items():
+        route = route or _get_product_route()
+        if not route:
+            continue
+
+        set_request(method="GET", path=f"/{route}")
+        response = get_response()
+        if response.status_code != 200:
+            # Needs a login; the page falls back to the default extract
+            continue
+
+        usage = get_above_the_fold_usage(response.get_data(as_text=True))
+        if default_usage is None:
+            default_usage = usage
+        else:
+            # Only what every page shows on top (navbar, page header) goes in the default
+            default_usage = {key: default_usage[key] & usage[key] for key in usage}
+
+        written[page] = _write(folder, page, extract_critical_css(rules, usage))
+
+    if default_usage is not None:
+        written[DEFAULT_PAGE] = _write(folder, DEFAULT_PAGE, extract_critical_css(rules, default_usage))
+
+    clear_critical_css()
+    return written
+
+
+def clear_critical_css():
+    """Drop the cached critical CSS so workers reload it from disk"""
+    from garval_store.page_cache import clear_page_cache
+
+    frappe.cache().delete_value(CRITICAL_CSS_CACHE_KEY)
+    clear_page_cache()
+
+
+def get_above_the_fold_usage(html):
+    """Get the tags, classes and ids used by the navbar and the first sections of <main>"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    usage = {"tags": {"html", "body"}, "classes": set(), "ids": set()}
+
+    roots = list(soup.find_all("header", limit=1))
+    if soup.main:
+        roots.extend(soup.main.find_all(recursive=False, limit=ABOVE_THE_FOLD_SECTIONS))
+    if soup.body:
+        usage["classes"].update(soup.body.get("class") or [])
+
+    for root in roots:
+        for element in [root, *root.find_all(True)]:
+            usage["tags"].add(element.name)
+            usage["classes"].update(element.get("class") or [])
+            if element.get("id"):
+                usage["ids"].add(element["id"])
+
+    return usage
+
+
+def parse_css(css):
+    """Split a stylesheet into [(prelude, body)], with @media bodies parsed recursively"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+
+    rules = []
+    position = 0
+    while True:
+        start = css.find("{", position)
+        if start == -1:
+            break
+
+        prelude = css[position:start].strip()
+        # Statements without a block, like @import or @charset, end with ";"
+        while ";" in prelude and prelude.startswith("@"):
+            statement, prelude = prelude.split(";", 1)
+            rules.append((statement.strip() + ";", None))
+            prelude = prelude.strip()
+
+        depth = 1
+        end = start + 1
+        while depth and end < len(css):
+            if css[end] == "{":
+                depth += 1
+            elif css[end] == "}":
+                depth -= 1
+            end += 1
+
+        body = css[start + 1:end - 1]
+        if prelude.startswith(("@media", "@supports")):
+            rules.append((prelude, parse_css(body)))
+        else:
+            rules.append((prelude, body.strip()))
+        position = end
+
+    return rules
+
+
+def extract_critical_css(rules, usage):
+    """Keep the rules whose selectors match elements in `usage`, minified"""
+    output = []
+    for prelude, body in rules:
+        if body is None:
+            output.append(prelude)
+        elif isinstance(body, list):
+            inner = extract_critical_css(body, usage)
+            if inner:
+                output.append(f"{_minify_selector(prelude)}{{{inner}}}")
+        elif prelude.startswith("@font-face"):
+            output.append(f"@font-face{{{_minify(body)}}}")
+        elif prelude.startswith("@"):
+            # @keyframes and friends are only needed once things move
+            continue
+        else:
+            selectors = [s.strip() for s in prelude.split(",") if _selector_matches(s.strip(), usage)]
+            if selectors:
+                output.append(f"{','.join(_minify_selector(s) for s in selectors)}{{{_minify(body)}}}")
+
+    return "".join(output)
+
+
+def _selector_matches(selector, usage):
+    if not selector or INTERACTIVE_PSEUDO_CLASSES.search(selector):
+        return False
+
+    # Ignore pseudo elements/classes and attribute filters, match what remains
+    selector = re.sub(r"::?[\w-]+(\([^)]*\))?", "", selector)
+    selector = re.sub(r"\[[^\]]*\]", "", selector)
+
+    for compound in re.split(r"\s*[>+~]\s*|\s+", selector.strip()):
+        if not compound or compound == "*":
+            continue
+
+        tag = re.match(r"^[a-zA-Z][\w-]*", compound)
+        if tag and tag.group(0).lower() not in usage["tags"]:
+            return False
+        if any(name not in usage["classes"] for name in re.findall(r"\.([\w-]+)", compound)):
+            return False
+        if any(name not in usage["ids"] for name in re.findall(r"#([\w-]+)", compound)):
+            return False
+
+    return True
+
+
+def _minify_selector(selector):
+    selector = re.sub(r"\s+", " ", selector).strip()
+    return re.sub(r"\s*([>+~])\s*", r"\1", selector)
+
+
+def _minify(css):
+    css = re.sub(r"\s+", " ", css).strip()
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    return css.rstrip(";")
+
+
+def _get_product_route():
+    route = frappe.db.get_value("Website Item", {"published": 1}, "route", order_by="ranking desc")
+    return f"product/{route}" if route and not route.startswith("product/") else route
+
+
+def _write(folder, page, css):
+    with open(os.path.join(folder, f"{page}.css"), "w") as f:
+        f.write(css)
+    return len(css)
@@ -0,0 +1,109 @@
+import frappe
+from frappe.utils import cint, flt
+
+# Separators and symbol position per storefront language. Other languages use
+# the Currency's own number format and symbol position.
+LANGUAGE_NUMBER_FORMATS = {
+    "es": {"decimal_separator": ",", "group_separator": ".", "symbol_on_right": True},
+    "en": {"decimal_separator": ".", "group_separator": ",", "symbol_on_right": False},
+}
+
+# Per worker formatters, keyed by site; rebuilt when the store settings version changes
+_currency_formatters = {}
+
+
+class CurrencyFormatter:
+    """Formats amounts of one currency for one language without touching the database"""
+
+    __slots__ = ("currency", "symbol", "decimals", "decimal_separator", "group_separator", "symbol_on_right")
+
+    def __init__(self, currency, symbol, decimals=2, decimal_separator=".", group_separator=",", symbol_on_right=False):
+        self.currency = currency
+        self.symbol = symbol
+        self.decimals = decimals
+        self.decimal_separator = decimal_separator
+        self.group_separator = group_separator
+        self.symbol_on_right = symbol_on_right
+
+    def format(self, amount):
+        """Format one amount, e.g. "1.234,50 €" (es) or "€1,234.50" (en)"""
+        amount = flt(amount, self.decimals)
+        number = f"{abs(amount):,.{self.decimals}f}"
+        if self.decimal_separator != "." or self.group_separator != ",":
+            number = number.translate({ord(","): self.group_separator, ord("."): self.decimal_separator})
+
+        sign = "-" if amount < 0 else ""
+        if self.symbol_on_right:
+            return f"{sign}{number} {self.symbol}"
+        return f"{sign}{self.symbol}{number}"
+
+    def format_many(self, amounts):
+        """Format a batch of amounts, e.g. every price of a listing or an order"""
+        return [self.format(amount) for amount in amounts]
+
+
+def get_currency_formatter(company=None, currency=None, lang=None):
+    """Get the formatter for a currency, or a company's default currency, in a language.
+
+    Formatters are built once per worker from the Currency record and reused
+    until the store settings change.
+    """
+    from garval_store.settings import get_store_settings, get_store_settings_version
+
+    settings = get_store_settings()
+    registry = _currency_formatters.get(frappe.local.site)
+    version = get_store_settings_version()
+    if not registry or registry["version"] != version:
+        registry = _currency_formatters[frappe.local.site] = {"version": version, "formatters": {}, "companies": {}}
+
+    if not currency:
+        if not company or company == settings.company:
+            currency = settings.currency
+        else:
+            if company not in registry["companies"]:
+                registry["companies"][company] = frappe.db.get_value("Company", company, "default_currency")
+            currency = registry["companies"][company]
+
+    lang = (lang or getattr(frappe.local, "lang", None) or "es")[:2]
+    key = (currency, lang)
+    formatter = registry["formatters"].get(key)
+    if not formatter:
+        formatter = registry["formatters"][key] = build_currency_formatter(currency, lang)
+
+    return formatter
+
+
+def build_currency_formatter(currency, lang):
+    """Build a formatter from the Currency record and the language's number format"""
+    details = frappe._dict()
+    if currency:
+        details = frappe.db.get_value(
+            "Currency", currency, ["symbol", "number_format", "symbol_on_right", "fraction_units"], as_dict=True
+        ) or frappe._dict()
+
+    number_format = LANGUAGE_NUMBER_FORMATS.get(lang)
+    if number_format:
+        decimal_separator = number_format["decimal_separator"]
+        group_separator = number_format["group_separator"]
+        symbol_on_right = number_format["symbol_on_right"]
+    else:
+        from frappe.utils import get_number_format_info
+
+        decimal_separator, group_separator, _precision = get_number_format_info(
+            details.number_format or frappe.db.get_default("number_format") or "#,###.##"
+        )
+        symbol_on_right = bool(cint(details.symbol_on_right))
+
+    fraction_units = cint(details.fraction_units)
+    decimals = len(str(fraction_units)) - 1 if fraction_units else 2
+
+    return CurrencyFormatter(
+        currency=currency,
+        # Fallback to currency code if symbol not found
+        symbol=details.symbol or currency or "€",
+        decimals=decimals,
+        decimal_separator=decimal_separator or ".",
+        group_separator=group_separator or "",
+        symbol_on_right=symbol_on_right,
+    )
+
@@ -0,0 +1,88 @@
+from hashlib import md5
+
+import frappe
+
+# Languages emails are written in; anything else gets the default
+EMAIL_LANGUAGES = ("es", "en")
+DEFAULT_EMAIL_LANGUAGE = "es"
+
+# Compiled message templates kept per worker before the oldest are dropped
+MAX_STRING_TEMPLATES = 64
+
+# Per worker Jinja environment and compiled templates. File templates are keyed
+# by name; message templates stored in documents by a hash of their source, so
+# an edited message compiles again without any invalidation.
+_email_environment = None
+_file_templates = {}
+_string_templates = {}
+
+
+def render_email_template(name, context=None, lang=None):
+    """Render templates/emails/<name> in a language, compiled once per worker"""
+    template = _file_templates.get(name)
+    if template is None:
+        template = _file_templates[name] = get_email_environment().get_template(name)
+
+    return template.render(get_email_context(context, lang))
+
+
+def render_message_template(source, context=None, lang=None):
+    """Render a message template stored in a document, like the Payment Gateway
+    Account message, compiled once per worker for each version of its source"""
+    if not source:
+        return ""
+
+    key = (frappe.local.site, md5(source.encode()).hexdigest())
+    template = _string_templates.get(key)
+    if template is None:
+        if len(_string_templates) >= MAX_STRING_TEMPLATES:
+            _string_templates.pop(next(iter(_string_templates)))
+        # Frappe's own environment, so the filters and methods frappe.render_template
+        # offers (money_in_words, frappe.format, jinja hooks...) keep working
+        template = _string_templates[key] = frappe.get_jenv().from_string(source)
+
+    from frappe.utils.safe_exec import get_safe_globals
+
+    # Globals depend on the session, so they are given per render instead of
+    # coming from the request the template was compiled in
+    return template.render(get_email_context({**get_safe_globals(), **(context or {})}, lang))
+
+
+def get_email_environment():
+    """Get the worker's Jinja environment for the templates in templates/emails"""
+    global _email_environment
+
+    if _email_environment is None:
+        from jinja2 import FileSystemLoader, select_autoescape
+        from jinja2.sandbox import SandboxedEnvironment
+
+        _email_environment = SandboxedEnvironment(
+            loader=FileSystemLoader(frappe.get_app_path("garval_store", "templates", "emails")),
+            autoescape=select_autoescape(["html"]),
+            auto_reload=False
+        )
+
+    return _email_environment
+
+
+def get_email_context(context=None, lang=None):
+    """Add the translation function of the email's language to a render context"""
+    lang = get_email_lang(lang)
+    return {
+        **(context or {}),
+        "lang": lang,
+        "_": lambda message, context=None: frappe._(message, lang=lang, context=context)
+    }
+
+
+def get_recipient_lang(email):
+    """Get the email language of a recipient: their User language, else the
+    language of the current request"""
+    lang = frappe.db.get_value("User", {"name": email}, "language") if email else None
+    return get_email_lang(lang)
+
+
+def get_email_lang(lang=None):
+    """Normalize a language to one emails are written in"""
+    lang = (lang or getattr(frappe.local, "lang", None) or DEFAULT_EMAIL_LANGUAGE)[:2]
+    return lang if lang in EMAIL_LANGUAGES else DEFAULT_EMAIL_LANGUAGE
@@ -0,0 +1,275 @@
+import frappe
+from frappe.utils import flt
+from garval_store.catalog import get_catalog_price_list, get_catalog_products
+
+# Redis hash holding the facet index, one field per price list and language like the catalog snapshot
+FACET_INDEX_CACHE_KEY = "garval_facet_index"
+
+# Price buckets shown in the shop as (from, to); the last one is open ended.
+# Bounds are inclusive like the price filter they link to, so a price on a
+# boundary is counted in both buckets it is listed under.
+PRICE_BUCKETS = ((0, 10), (10, 20), (20, 50), (50, None))
+
+
+def get_facet_index(price_list=None, lang=None):
+    """Get the facet index for the published catalog, building it from the snapshot if needed.
+
+    Every facet value maps to a bitset (a Python int) over item positions, so
+    filters combine with `&` and counts are popcounts.
+    """
+    price_list = price_list or get_catalog_price_list()
+    lang = lang or frappe.local.lang or "es"
+    key = f"{price_list}::{lang}"
+
+    index = frappe.cache().hget(FACET_INDEX_CACHE_KEY, key)
+    if index is None:
+        index = build_facet_index(get_catalog_products(price_list, lang))
+        frappe.cache().hset(FACET_INDEX_CACHE_KEY, key, index)
+
+    return index
+
+
+def build_facet_index(products):
+    """Build a facet index over formatted catalog products"""
+    index = frappe._dict({
+        "positions": {},
+        "item_codes": [],
+        "prices": [],
+        "live": 0,
+        "facets": {"item_group": {}, "price": {}, "in_stock": {}, "attributes": {}}
+    })
+
+    attributes = get_item_attributes([p.item_code for p in products])
+    for product in products:
+        _add_product(index, product, attributes.get(product.item_code, []))
+
+    return index
+
+
+def update_facet_index(item_codes):
+    """Refresh the given items in every cached facet index.
+
+    Called after the catalog snapshot has been patched, so it reads the
+    updated products from there.
+    """
+    item_codes = set(item_codes or [])
+    if not item_codes:
+        return
+
+    cache = frappe.cache()
+    attributes = get_item_attributes(item_codes)
+
+    for key in cache.hkeys(FACET_INDEX_CACHE_KEY) or []:
+        key = frappe.safe_decode(key)
+        index = cache.hget(FACET_INDEX_CACHE_KEY, key)
+        if index is None:
+            continue
+
+        price_list, lang = key.split("::", 1)
+        products = {p.item_code: p for p in get_catalog_products(price_list, lang) if p.item_code in item_codes}
+
+        for item_code in item_codes:
+            _remove_product(index, item_code)
+            if item_code in products:
+                _add_product(index, products[item_code], attributes.get(item_code, []))
+
+        cache.hset(FACET_INDEX_CACHE_KEY, key, index)
+
+
+def clear_facet_index(*args, **kwargs):
+    """Drop every cached facet index"""
+    frappe.cache().delete_value(FACET_INDEX_CACHE_KEY)
+
+
+def get_item_attributes(item_codes):
+    """Get [(attribute, value)] per item from Item Variant Attribute"""
+    if not item_codes:
+        return {}
+
+    attributes = {}
+    for row in frappe.get_all(
+        "Item Variant Attribute",
+        filters={"parent": ["in", list(item_codes)], "parenttype": "Item"},
+        fields=["parent", "attribute", "attribute_value"],
+        order_by="idx asc"
+    ):
+        if row.attribute_value:
+            attributes.setdefault(row.parent, []).append((row.attribute, row.attribute_value))
+    return attributes
+
+
+def get_price_bucket_labels(price):
+    """Get the labels of the price buckets whose filter lists a price; none for
+    an unpriced item, which no price filter lists"""
+    price = flt(price) or None
+    return [
+        _get_bucket_label(price_from, price_to)
+        for price_from, price_to in PRICE_BUCKETS
+        if _in_price_range(price, price_from, price_to)
+    ]
+
+
+def get_price_buckets():
+    """Get the price buckets with their label and the price range they filter on"""
+    return [
+        frappe._dict({
+            "label": _get_bucket_label(price_from, price_to),
+            "price_min": price_from,
+            "price_max": price_to
+        })
+        for price_from, price_to in PRICE_BUCKETS
+    ]
+
+
+def search_facets(index, item_group=None, attributes=None, in_stock=False, price_min=None, price_max=None, item_codes=None):
+    """Combine the selected filters and count every facet value.
+
+    `attributes` maps attribute name to a list of selected values; values of one
+    attribute are OR-ed, everything else is AND-ed. Each facet is counted
+    against the other selected filters only, so its own values stay selectable.
+    `item_codes` optionally limits everything to a preselected set, e.g. search results.
+
+    Returns a dict with the matching `item_codes` (in catalog order) and `facets`
+    holding the value counts.
+    """
+    facets = index.facets
+    everything = index.live
+    if item_codes is not None:
+        everything &= _union(1 << index.positions[code] for code in item_codes if code in index.positions)
+
+    group_mask = facets["item_group"].get(item_group, 0) if item_group else everything
+    stock_mask = facets["in_stock"].get("1", 0) if in_stock else everything
+    price_mask = _get_price_range_mask(index, price_min, price_max)
+
+    attribute_masks = {}
+    for attribute, values in (attributes or {}).items():
+        values = [value for value in values or [] if value]
+        if values:
+            value_bits = facets["attributes"].get(attribute, {})
+            attribute_masks[attribute] = _union(value_bits.get(value, 0) for value in values)
+
+    all_attributes_mask = _intersect(attribute_masks.values(), everything)
+    matching = everything & group_mask & stock_mask & price_mask & all_attributes_mask
+
+    counts = {
+        "item_group": _count_values(facets["item_group"], everything & stock_mask & price_mask & all_attributes_mask),
+        "price": _count_values(facets["price"], everything & group_mask & stock_mask & all_attributes_mask),
+        "in_stock": _popcount(facets["in_stock"].get("1", 0) & everything & group_mask & price_mask & all_attributes_mask),
+        "attributes": {}
+    }
+
+    for attribute, value_bits in facets["attributes"].items():
+        other_attributes_mask = _intersect(
+            (mask for name, mask in attribute_masks.items() if name != attribute), everything
+        )
+        counts["attributes"][attribute] = _count_values(
+            value_bits, everything & group_mask & stock_mask & price_mask & other_attributes_mask
+        )
+
+    return frappe._dict({
+        "item_codes": [index.item_codes[position] for position in _iter_positions(matching)],
+        "count": _popcount(matching),
+        "facets": counts
+    })
+
+
+def _add_product(index, product, attributes):
+    position = index.positions.get(product.item_code)
+    if position is None:
+        position = index.positions[product.item_code] = len(index.item_codes)
+        index.item_codes.append(product.item_code)
+        index.prices.append(None)
+
+    bit = 1 << position
+    index.live |= bit
+    index.prices[position] = flt(product.price) or None
+
+    facets = index.facets
+    _set_bit(facets["item_group"], product.item_group, bit)
+    for label in get_price_bucket_labels(product.price):
+        _set_bit(facets["price"], label, bit)
+    _set_bit(facets["in_stock"], "0" if product.out_of_stock else "1", bit)
+    for attribute, value in attributes:
+        _set_bit(facets["attributes"].setdefault(attribute, {}), value, bit)
+
+
+def _remove_product(index, item_code):
+    # The position stays reserved for the item code so a re-published item reuses it
+    position = index.positions.get(item_code)
+    if position is None:
+        return
+
+    bit = 1 << position
+    index.live &= ~bit
+    index.prices[position] = None
+
+    value_maps = [index.facets["item_group"], index.facets["price"], index.facets["in_stock"]]
+    value_maps.extend(index.facets["attributes"].values())
+    for value_bits in value_maps:
+        for value in list(value_bits):
+            value_bits[value] &= ~bit
+            if not value_bits[value]:
+                del value_bits[value]
+
+    for attribute in [name for name, value_bits in index.facets["attributes"].items() if not value_bits]:
+        del index.facets["attributes"][attribute]
+
+
+def _set_bit(value_bits, value, bit):
+    if value:
+        value_bits[value] = value_bits.get(value, 0) | bit
+
+
+def _get_price_range_mask(index, price_min=None, price_max=None):
+    if price_min in (None, "") and price_max in (None, ""):
+        return index.live
+
+    mask = 0
+    for position in _iter_positions(index.live):
+        if _in_price_range(index.prices[position], price_min, price_max):
+            mask |= 1 << position
+    return mask
+
+
+def _in_price_range(price, price_min=None, price_max=None):
+    # Same bounds as the catalog query: [min, max], and unpriced items never match
+    if price is None:
+        return False
+    if price_min not in (None, "") and price < flt(price_min):
+        return False
+    if price_max not in (None, "") and price > flt(price_max):
+        return False
+    return True
+
+
+def _get_bucket_label(price_from, price_to):
+    return f"{price_from}-{price_to}" if price_to is not None else f"{price_from}+"
+
+
+def _count_values(value_bits, mask):
+    return {value: _popcount(bits & mask) for value, bits in value_bits.items()}
+
+
+def _union(masks):
+    result = 0
+    for mask in masks:
+        result |= mask
+    return result
+
+
+def _intersect(masks, everything):
+    result = everything
+    for mask in masks:
+        result &= mask
+    return result
+
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+def _iter_positions(mask):
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
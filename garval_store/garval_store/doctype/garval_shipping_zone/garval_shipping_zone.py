@@ -0,0 +1,13 @@
+# Copyright (c) 2026, Kashif Ali
+# License: MIT
+
+from frappe.model.document import Document
+
+from garval_store.shipping import expand_postal_range
+
+
+class GarvalShippingZone(Document):
+	def validate(self):
+		# Throws on malformed or oversized ranges before they reach the index
+		for row in self.postal_codes:
+			expand_postal_range(row.from_prefix, row.to_prefix)
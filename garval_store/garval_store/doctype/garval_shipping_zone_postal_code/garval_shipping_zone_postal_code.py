@@ -0,0 +1,8 @@
+# Copyright (c) 2026, Kashif Ali
+# License: MIT
+
+from frappe.model.document import Document
+
+
+class GarvalShippingZonePostalCode(Document):
+	pass
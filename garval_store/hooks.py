@@ -46,23 +46,128 @@ app_include_css = []
 
 app_include_js = []
 
-# Web includes (for website pages only)
+# Web includes (for website pages only). Bundles are minified and content
+# hashed by `bench build` and resolved through the assets.json manifest.
 web_include_css = [
-    "/assets/garval_store/css/garval.css"
+    "garval.bundle.css"
 ]
 
 web_include_js = [
-    "/assets/garval_store/js/garval.js"
+    "garval.bundle.js"
 ]
 
 # DocTypes
-# doc_events = {}
+doc_events = {
+    "Website Item": {
+        "on_update": [
+            "garval_store.catalog.on_catalog_change",
+            "garval_store.product_routes.on_website_item_update",
+            "garval_store.search.on_website_item_change",
+            "garval_store.typeahead.on_website_item_change",
+            "garval_store.images.on_website_item_change"
+        ],
+        "on_trash": [
+            "garval_store.catalog.on_catalog_change",
+            "garval_store.product_routes.on_website_item_change",
+            "garval_store.search.on_website_item_change",
+            "garval_store.typeahead.on_website_item_change"
+        ],
+        "after_rename": [
+            "garval_store.catalog.on_catalog_rename",
+            "garval_store.product_routes.on_website_item_change",
+            "garval_store.search.on_website_item_change",
+            "garval_store.typeahead.on_website_item_change"
+        ]
+    },
+    "Item": {
+        "on_update": [
+            "garval_store.catalog.on_catalog_change",
+            "garval_store.shipping.on_item_change"
+        ],
+        "after_rename": [
+            "garval_store.catalog.on_catalog_rename",
+            "garval_store.shipping.on_item_change"
+        ]
+    },
+    "Item Price": {
+        "on_update": [
+            "garval_store.catalog.on_catalog_change",
+            "garval_store.pricing.on_item_price_change"
+        ],
+        "on_trash": [
+            "garval_store.catalog.on_catalog_change",
+            "garval_store.pricing.on_item_price_change"
+        ]
+    },
+    "Bin": {
+        "on_update": "garval_store.catalog.on_catalog_change"
+    },
+    "Company": {
+        "on_update": [
+            "garval_store.page_cache.on_page_data_change",
+            "garval_store.settings.on_settings_change"
+        ]
+    },
+    "Webshop Settings": {
+        "on_update": [
+            "garval_store.page_cache.on_page_data_change",
+            "garval_store.settings.on_settings_change"
+        ]
+    },
+    "Global Defaults": {
+        "on_update": "garval_store.settings.on_settings_change"
+    },
+    "Selling Settings": {
+        "on_update": "garval_store.settings.on_settings_change"
+    },
+    "Stock Settings": {
+        "on_update": "garval_store.settings.on_settings_change"
+    },
+    "Currency": {
+        "on_update": "garval_store.settings.on_settings_change"
+    },
+    "Sales Taxes and Charges Template": {
+        "on_update": "garval_store.taxes.on_tax_template_change",
+        "on_trash": "garval_store.taxes.on_tax_template_change",
+        "after_rename": "garval_store.taxes.on_tax_template_change"
+    },
+    "Sales Order": {
+        "on_submit": "garval_store.reservations.on_sales_order_submit"
+    },
+    "Garval Shipping Zone": {
+        "on_update": "garval_store.shipping.on_shipping_zone_change",
+        "on_trash": "garval_store.shipping.on_shipping_zone_change",
+        "after_rename": "garval_store.shipping.on_shipping_zone_change"
+    },
+    "Garval Product Route Redirect": {
+        "on_update": "garval_store.product_routes.on_route_redirect_change",
+        "on_trash": "garval_store.product_routes.on_route_redirect_change"
+    },
+    "File": {
+        "after_insert": "garval_store.images.on_file_change",
+        "on_trash": "garval_store.images.on_file_change"
+    }
+}
 
 # On session creation hook - run cart setup as Administrator to avoid permission errors
 on_session_creation = "garval_store.user_hooks.on_session_creation"
 
 # Scheduled Tasks
-# scheduler_events = {}
+scheduler_events = {
+    # Stock postings update Bin quantities without document events,
+    # so the catalog snapshot is also rebuilt periodically
+    "hourly": [
+        "garval_store.catalog.clear_catalog_snapshot"
+    ],
+    "daily": [
+        "garval_store.related_products.build_related_products",
+        # Typeahead suggestions are ranked by sales
+        "garval_store.typeahead.clear_typeahead_index"
+    ],
+    "weekly": [
+        "garval_store.invoice_pdf.clear_old_invoice_pdfs"
+    ]
+}
 
 # Installation hooks
 after_install = "garval_store.install.after_install"
@@ -79,10 +184,18 @@ update_website_context = "garval_store.utils.update_website_context"
 # Custom path resolver to handle /product/... routes
 website_path_resolver = "garval_store.utils.resolve_product_path"
 
+# Serve cached HTML to guests before the standard renderers run
+page_renderer = ["garval_store.page_cache.GuestPageCacheRenderer"]
+
+# Store rendered guest pages in the page cache
+after_request = ["garval_store.page_cache.after_request"]
+
 # Jinja environment customizations
 jinja = {
     "methods": [
-        "garval_store.utils.get_lang"
+        "garval_store.utils.get_lang",
+        "garval_store.images.responsive_image",
+        "garval_store.critical_css.get_critical_css"
     ]
 }
 
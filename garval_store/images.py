@@ -0,0 +1,227 @@
+import os
+import time
+from hashlib import md5
+
+import frappe
+from markupsafe import Markup, escape
+
+# Redis hash mapping an image URL to its derivatives, see get_derivatives
+IMAGE_DERIVATIVES_CACHE_KEY = "garval_image_derivatives"
+
+# Seconds before an image is queued again: while its job may still be running,
+# and after generation failed or the file was missing
+DERIVATIVES_PENDING_RETRY = 10 * 60
+DERIVATIVES_FAILED_RETRY = 60 * 60
+
+# Widths generated for every image; widths above the original are skipped
+IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)
+
+# Output formats as (format, extension, save options). WebP is offered first
+# through <picture>, JPEG is the fallback for older browsers.
+IMAGE_FORMATS = (
+    ("webp", "webp", {"quality": 78, "method": 6}),
+    ("jpeg", "jpg", {"quality": 80, "optimize": True, "progressive": True}),
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Folder under the site's public files holding the derivatives
+DERIVATIVES_FOLDER = "garval_images"
+
+
+def responsive_image(src, alt="", sizes="100vw", css_class=None, loading="lazy", style=None):
+    """Jinja helper rendering an image with WebP/JPEG srcsets when derivatives exist.
+
+    Until they are generated the plain <img> is rendered and generation is
+    queued, so a page never waits on image processing.
+    """
+    attributes = {
+        "alt": alt or "",
+        "class": css_class,
+        "loading": loading,
+        "style": style,
+    }
+
+    derivatives = get_derivatives(src) if src else None
+    if not derivatives:
+        return Markup(f"<img {_render_attributes({'src': src, **attributes})}>")
+
+    sources = []
+    for fmt, _extension, _options in IMAGE_FORMATS[:-1]:
+        if derivatives.get(fmt):
+            sources.append(
+                f'<source type="image/{fmt}" {_render_attributes({"srcset": _get_srcset(derivatives[fmt]), "sizes": sizes})}>'
+            )
+
+    fallback = derivatives.get(IMAGE_FORMATS[-1][0]) or []
+    img = _render_attributes({
+        "src": fallback[-1][1] if fallback else src,
+        "srcset": _get_srcset(fallback) if fallback else None,
+        "sizes": sizes if fallback else None,
+        **attributes
+    })
+    return Markup(f'<picture class="garval-picture">{"".join(sources)}<img {img}></picture>')
+
+
+def get_derivatives(src):
+    """Get {format: [(width, url)]} for an image URL, queueing generation on first
+    sight and again once a pending or failed attempt is due for a retry"""
+    src = _normalize_src(src)
+    if not src:
+        return None
+
+    entry = frappe.cache().hget(IMAGE_DERIVATIVES_CACHE_KEY, src)
+    if entry and "retry_after" not in entry:
+        return entry
+
+    if not entry or entry["retry_after"] <= time.time():
+        # Mark as pending so concurrent renders queue a single job, and a lost
+        # job is queued again after DERIVATIVES_PENDING_RETRY
+        _set_retry_marker(src, DERIVATIVES_PENDING_RETRY)
+        enqueue_derivatives(src)
+
+    return None
+
+
+def enqueue_derivatives(src):
+    """Queue derivative generation for an image URL"""
+    frappe.enqueue(
+        "garval_store.images.generate_derivatives",
+        queue="long",
+        job_id=f"garval_image::{src}",
+        deduplicate=True,
+        src=src
+    )
+
+
+def generate_derivatives(src, force=False):
+    """Write the resized WebP/JPEG derivatives of an image to disk and cache their URLs.
+
+    File names include a hash of the source path, size and modification time,
+    so a changed image gets new URLs and existing files are reused.
+    """
+    from PIL import Image, ImageOps
+
+    src = _normalize_src(src)
+    if not src:
+        return {}
+
+    path = _get_source_path(src)
+    if not path or not os.path.exists(path):
+        _set_retry_marker(src, DERIVATIVES_FAILED_RETRY)
+        return {}
+
+    stat = os.stat(path)
+    key = md5(f"{src}::{stat.st_size}::{stat.st_mtime}".encode()).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    folder = frappe.get_site_path("public", "files", DERIVATIVES_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+
+    derivatives = {}
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            widths = [width for width in IMAGE_WIDTHS if width < image.width] + [image.width]
+
+            for fmt, extension, options in IMAGE_FORMATS:
+                derivatives[fmt] = []
+                for width in widths:
+                    filename = f"{stem}-{key}-{width}w.{extension}"
+                    target = os.path.join(folder, filename)
+
+                    if force or not os.path.exists(target):
+                        height = round(image.height * width / image.width)
+                        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+                        if fmt == "jpeg" and resized.mode not in ("RGB", "L"):
+                            resized = resized.convert("RGB")
+                        resized.save(target, fmt.upper(), **options)
+
+                    derivatives[fmt].append((width, f"/files/{DERIVATIVES_FOLDER}/{filename}"))
+
+    except Exception as e:
+        frappe.log_error(f"Image derivative error for {src}: {str(e)}")
+        derivatives = {}
+
+    if not derivatives:
+        _set_retry_marker(src, DERIVATIVES_FAILED_RETRY)
+        return {}
+
+    frappe.cache().hset(IMAGE_DERIVATIVES_CACHE_KEY, src, derivatives)
+
+    # Cached guest pages still reference the plain image
+    from garval_store.page_cache import clear_page_cache
+    clear_page_cache()
+
+    return derivatives
+
+
+def backfill_derivatives(force=False):
+    """Generate derivatives for the app's static images and every Website Item image"""
+    sources = []
+
+    images_folder = frappe.get_app_path("garval_store", "public", "images")
+    for filename in sorted(os.listdir(images_folder)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            sources.append(f"/assets/garval_store/images/{filename}")
+
+    for image in frappe.get_all("Website Item", filters={"website_image": ["is", "set"]}, pluck="website_image"):
+        if image not in sources:
+            sources.append(image)
+
+    for src in sources:
+        generate_derivatives(src, force=force)
+
+    return len(sources)
+
+
+def on_file_change(doc, method=None):
+    """doc_events handler for File: process uploaded public images"""
+    src = _normalize_src(doc.file_url)
+    if not src or doc.is_private or not src.lower().endswith(IMAGE_EXTENSIONS):
+        return
+
+    frappe.cache().hdel(IMAGE_DERIVATIVES_CACHE_KEY, src)
+    if method != "on_trash":
+        frappe.db.after_commit.add(lambda: enqueue_derivatives(src))
+
+
+def on_website_item_change(doc, method=None):
+    """doc_events handler for Website Item: process a new website image"""
+    before = doc.get_doc_before_save()
+    src = _normalize_src(doc.website_image)
+    if src and (not before or before.website_image != doc.website_image):
+        frappe.cache().hdel(IMAGE_DERIVATIVES_CACHE_KEY, src)
+        frappe.db.after_commit.add(lambda: enqueue_derivatives(src))
+
+
+def _normalize_src(src):
+    src = (src or "").split("?", 1)[0].strip()
+    if ".." in src:
+        return None
+    if src.startswith(("/files/", "/assets/")) and not src.startswith(f"/files/{DERIVATIVES_FOLDER}/"):
+        return src
+    return None
+
+
+def _set_retry_marker(src, retry_in):
+    frappe.cache().hset(IMAGE_DERIVATIVES_CACHE_KEY, src, {"retry_after": time.time() + retry_in})
+
+
+def _get_source_path(src):
+    if src.startswith("/files/"):
+        return frappe.get_site_path("public", "files", src[len("/files/"):])
+
+    # /assets/<app>/<path> is served from the app's public folder
+    parts = src[len("/assets/"):].split("/", 1)
+    if len(parts) == 2 and parts[0] in frappe.get_installed_apps():
+        return frappe.get_app_path(parts[0], "public", *parts[1].split("/"))
+    return None
+
+
+def _get_srcset(derivatives):
+    return ", ".join(f"{url} {width}w" for width, url in derivatives)
+
+
+def _render_attributes(attributes):
+    return " ".join(f'{name}="{escape(value)}"' for name, value in attributes.items() if value is not None)
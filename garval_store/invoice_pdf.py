@@ -0,0 +1,106 @@
+import os
+from hashlib import sha1
+
+import frappe
+
+# Folder under the site's private files holding the rendered PDFs
+PDF_CACHE_FOLDER = "garval_invoice_pdfs"
+
+DEFAULT_PRINT_FORMAT = "Standard"
+
+# Cached PDFs untouched for this long are removed by clear_old_invoice_pdfs
+PDF_CACHE_MAX_AGE_DAYS = 90
+
+
+def get_invoice_pdf(doctype, name, print_format=DEFAULT_PRINT_FORMAT, lang=None):
+    """Get the PDF of a document, rendering it only when this version is not cached.
+
+    PDFs are stored on disk under a hash of (doctype, name, modified, print
+    format, language), so a re-send or a download of an unchanged document
+    returns the same bytes and an edited one gets a new file.
+    """
+    path = get_pdf_path(doctype, name, print_format, lang)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    pdf = frappe.attach_print(doctype, name, print_format=print_format, lang=get_pdf_lang(lang))["fcontent"]
+
+    # Written under a temporary name so a concurrent reader never sees half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{frappe.generate_hash(length=8)}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(temp_path, path)
+
+    return pdf
+
+
+def get_pdf_path(doctype, name, print_format=DEFAULT_PRINT_FORMAT, lang=None):
+    """Get where the PDF of the document's current version is cached"""
+    key = get_pdf_key(doctype, name, print_format, lang)
+    return frappe.get_site_path("private", PDF_CACHE_FOLDER, key[:2], f"{key}.pdf")
+
+
+def get_pdf_key(doctype, name, print_format=DEFAULT_PRINT_FORMAT, lang=None):
+    """Hash the document version, print format and language into a cache key"""
+    modified = frappe.db.get_value(doctype, name, "modified")
+    return sha1(f"{doctype}::{name}::{modified}::{print_format}::{get_pdf_lang(lang)}".encode()).hexdigest()
+
+
+def get_pdf_lang(lang=None):
+    """Get the language a PDF is rendered in"""
+    return lang or getattr(frappe.local, "lang", None) or "es"
+
+
+def enqueue_invoice_email(doctype, name, recipients, subject, content, print_format=DEFAULT_PRINT_FORMAT, lang=None):
+    """Queue an email with a document's PDF attached, rendering the PDF in the background"""
+    frappe.enqueue(
+        "garval_store.invoice_pdf.send_invoice_email",
+        queue="long",
+        enqueue_after_commit=True,
+        doctype=doctype,
+        name=name,
+        recipients=recipients,
+        subject=subject,
+        content=content,
+        print_format=print_format,
+        lang=lang
+    )
+
+
+def send_invoice_email(doctype, name, recipients, subject, content, print_format=DEFAULT_PRINT_FORMAT, lang=None):
+    """Background job: attach the cached PDF of a document and put the email in the outbox"""
+    from garval_store.outbox import queue_email
+
+    attachments = []
+    try:
+        attachments.append({"fname": f"{name}.pdf", "fcontent": get_invoice_pdf(doctype, name, print_format, lang)})
+    except Exception:
+        # The message still carries the payment details, so send it without the PDF
+        frappe.log_error(frappe.get_traceback(), f"Invoice PDF Error: {name}")
+
+    queue_email(
+        recipients=recipients,
+        subject=subject,
+        content=content,
+        attachments=attachments,
+        reference_doctype=doctype,
+        reference_name=name
+    )
+
+
+def clear_old_invoice_pdfs():
+    """Scheduled job: remove cached PDFs not used for PDF_CACHE_MAX_AGE_DAYS"""
+    import time
+
+    folder = frappe.get_site_path("private", PDF_CACHE_FOLDER)
+    if not os.path.isdir(folder):
+        return
+
+    expiry = time.time() - PDF_CACHE_MAX_AGE_DAYS * 24 * 60 * 60
+    for root, _dirs, filenames in os.walk(folder):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if os.path.getatime(path) < expiry and os.path.getmtime(path) < expiry:
+                os.remove(path)
@@ -1,6 +1,8 @@
 import frappe
 from frappe import _
-from garval_store.utils import format_currency
+from garval_store.currency import get_currency_formatter
+from garval_store.emails import get_recipient_lang, render_email_template
+from garval_store.outbox import queue_email
 
 
 @frappe.whitelist()
@@ -51,48 +53,19 @@ def send_order_confirmation(payment_request_name):
 
 def _send_confirmation_email(order, email):
     """Send order confirmation email with order details"""
-    subject = _("Payment Confirmed - Order {0}").format(order.name)
-
-    message = f"""
-    <h2>{_('Payment Received - Thank You!')}</h2>
-    <p>{_('We have received your payment for order')} <strong>{order.name}</strong>.</p>
-    <p>{_('Your order is now being processed.')}</p>
-
-    <h3>{_('Order Details')}</h3>
-    <table style="width: 100%; border-collapse: collapse;">
-        <tr style="background: #f5f5f5;">
-            <th style="padding: 10px; text-align: left;">{_('Product')}</th>
-            <th style="padding: 10px; text-align: right;">{_('Qty')}</th>
-            <th style="padding: 10px; text-align: right;">{_('Price')}</th>
-        </tr>
-    """
-
-    for item in order.items:
-        message += f"""
-        <tr>
-            <td style="padding: 10px; border-bottom: 1px solid #ddd;">{item.item_name}</td>
-            <td style="padding: 10px; border-bottom: 1px solid #ddd; text-align: right;">{int(item.qty)}</td>
-            <td style="padding: 10px; border-bottom: 1px solid #ddd; text-align: right;">{format_currency(item.amount)}</td>
-        </tr>
-        """
-
-    message += f"""
-    </table>
+    lang = get_recipient_lang(email)
+    formatter = get_currency_formatter(currency=order.currency, lang=lang)
 
-    <p style="margin-top: 20px; font-size: 18px;">
-        <strong>{_('Total')}: {format_currency(order.grand_total)}</strong>
-    </p>
-
-    <p>{_('We will notify you when your order ships.')}</p>
-
-    <p>{_('Best regards,')}<br>Finca Garval</p>
-    """
+    subject = _("Payment Confirmed - Order {0}", lang=lang).format(order.name)
+    message = render_email_template("payment_confirmation.html", {
+        "order": order,
+        "format_currency": formatter.format
+    }, lang=lang)
 
-    frappe.sendmail(
+    queue_email(
         recipients=[email],
         subject=subject,
         message=message,
         reference_doctype="Sales Order",
-        reference_name=order.name,
-        now=True
+        reference_name=order.name
     )
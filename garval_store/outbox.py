@@ -0,0 +1,84 @@
+from hashlib import md5
+
+import frappe
+
+# Redis key prefix marking an email as queued for a recipient, see queue_email
+OUTBOX_DEDUPE_CACHE_KEY = "garval_outbox::"
+
+# How long an identical email to the same recipient is suppressed, in seconds
+DEDUPE_TTL = 10 * 60
+
+# Email Queue statuses that still need a delivery attempt
+PENDING_STATUSES = ("Not Sent", "Partially Sent")
+
+
+def queue_email(recipients, subject, message=None, content=None, dedupe_key=None, dedupe_ttl=DEDUPE_TTL, **kwargs):
+    """Put a transactional email in the outbox and return without waiting on SMTP.
+
+    The email is stored as an Email Queue record, which keeps its delivery
+    status and retries, and a short job delivers it right after the request
+    commits. The scheduler's queue flush picks up anything that job misses.
+
+    Recipients already sent the same email (same `dedupe_key`, or the same
+    subject and body) within `dedupe_ttl` seconds are skipped, so double
+    submits and retried requests do not mail anyone twice. Other keyword
+    arguments are passed on to frappe.sendmail.
+    """
+    if isinstance(recipients, str):
+        recipients = [recipients]
+
+    if not dedupe_key:
+        dedupe_key = md5(f"{subject}::{message or content}".encode()).hexdigest()
+
+    cache = frappe.cache()
+    claimed = {}
+    for recipient in dict.fromkeys(filter(None, recipients)):
+        key = cache.make_key(f"{OUTBOX_DEDUPE_CACHE_KEY}{dedupe_key}::{recipient.lower()}")
+        if cache.set(key, 1, nx=True, ex=dedupe_ttl):
+            claimed[recipient] = key
+
+    if not claimed:
+        return None
+
+    try:
+        email_queue = frappe.sendmail(
+            recipients=list(claimed),
+            subject=subject,
+            message=message,
+            content=content,
+            now=False,
+            **kwargs
+        )
+    except Exception:
+        # Not queued, so a retry must not be taken for a duplicate
+        cache.delete(*claimed.values())
+        raise
+
+    # Same if the request rolls back and takes the Email Queue record with it
+    frappe.db.after_rollback.add(lambda: cache.delete(*claimed.values()))
+
+    if email_queue:
+        frappe.enqueue(
+            "garval_store.outbox.deliver_email",
+            queue="short",
+            job_id=f"garval_outbox::{email_queue.name}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            email_queue=email_queue.name
+        )
+
+    return email_queue
+
+
+def deliver_email(email_queue):
+    """Background job: send one Email Queue record if it is still pending.
+
+    A failed attempt is recorded on the record, which stays pending until its
+    retries are used up; the scheduler's queue flush makes the next attempts.
+    """
+    status = frappe.db.get_value("Email Queue", email_queue, "status")
+    if status not in PENDING_STATUSES:
+        return
+
+    frappe.get_doc("Email Queue", email_queue).send()
+
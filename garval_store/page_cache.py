@@ -0,0 +1,120 @@
+import frappe
+from urllib.parse import urlencode
+from frappe.website.page_renderers.base_renderer import BaseRenderer
+from garval_store.utils import get_lang
+
+PAGE_CACHE_KEY_PREFIX = "garval_page_cache::"
+
+# Rendered HTML is kept for at most an hour even if no invalidation arrives
+PAGE_CACHE_TTL = 60 * 60
+
+# Guest pages whose HTML only depends on language, query args and catalog/company data.
+# Cart, checkout and account pages are never cached.
+PAGE_CACHE_ROUTES = (
+    "home",
+    "shop",
+    "about",
+    "contact",
+    "politica_privacidad",
+    "aviso_legal",
+    "politica_cookies",
+    "declaracion_accesibilidad",
+)
+
+# Query args that change the rendered HTML, with the value that is equivalent to leaving them out
+PAGE_CACHE_QUERY_ARGS = {
+    "q": None,
+    "category": None,
+    "sort": "newest",
+    "page": "1",
+    "price_min": None,
+    "price_max": None,
+    "in_stock": "0",
+    "attr": None,
+}
+
+
+class GuestPageCacheRenderer(BaseRenderer):
+    """Serve cached HTML for guest visits to the pages in PAGE_CACHE_ROUTES.
+
+    Registered through the `page_renderer` hook so it is tried before Frappe's
+    own renderers. Pages are stored by `after_request` on a cache miss.
+    """
+
+    def can_render(self):
+        if not is_page_cacheable(self.path):
+            return False
+
+        self.html = frappe.cache().get_value(get_page_cache_key(self.path))
+        return self.html is not None
+
+    def render(self):
+        frappe.local.garval_page_cache_hit = True
+        frappe.local.response.from_cache = True
+        return self.build_response(self.html)
+
+
+def is_page_cacheable(route):
+    """Check if the current request may read or write the page cache for `route`"""
+    request = getattr(frappe.local, "request", None)
+    if not request or request.method != "GET":
+        return False
+
+    if route not in PAGE_CACHE_ROUTES:
+        return False
+
+    if frappe.session.user != "Guest":
+        return False
+
+    if frappe.flags.force_website_cache:
+        return True
+
+    return not (frappe.conf.disable_website_cache or frappe.conf.developer_mode)
+
+
+def get_page_cache_key(route):
+    """Build the cache key from route, language and the normalized query args"""
+    args = frappe.local.request.args
+    query = []
+    for key, default in sorted(PAGE_CACHE_QUERY_ARGS.items()):
+        if key == "sort" and (args.get("q") or "").strip():
+            # The shop sorts searches by relevance unless asked otherwise
+            default = "relevance"
+        for value in sorted(set(args.getlist(key))):
+            value = (value or "").strip()
+            if value and value != default:
+                query.append((key, value))
+
+    return f"{PAGE_CACHE_KEY_PREFIX}{route}::{get_lang()}::{urlencode(query)}"
+
+
+def after_request(response, request):
+    """Store the rendered HTML of cacheable guest pages"""
+    try:
+        if getattr(frappe.local, "garval_page_cache_hit", False):
+            return
+
+        if response.status_code != 200 or response.mimetype != "text/html":
+            return
+
+        route = frappe.safe_decode(response.headers.get("X-Page-Name") or "")
+        if not is_page_cacheable(route):
+            return
+
+        frappe.cache().set_value(
+            get_page_cache_key(route),
+            response.get_data(as_text=True),
+            expires_in_sec=PAGE_CACHE_TTL
+        )
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Page Cache Error")
+
+
+def clear_page_cache(*args, **kwargs):
+    """Drop every cached guest page"""
+    frappe.cache().delete_keys(PAGE_CACHE_KEY_PREFIX)
+
+
+def on_page_data_change(doc, method=None):
+    """doc_events handler for documents shown on the cached pages (Company, Webshop Settings)"""
+    frappe.db.after_commit.add(clear_page_cache)
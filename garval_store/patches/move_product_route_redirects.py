@@ -0,0 +1,18 @@
+import frappe
+
+# Redis hash the redirects were kept in before they were stored as records
+OLD_REDIRECTS_CACHE_KEY = "garval_product_route_redirects"
+
+
+def execute():
+	"""Store the product route redirects kept only in Redis as Garval Product Route Redirect records"""
+	from garval_store.product_routes import save_product_route_redirect
+
+	cache = frappe.cache()
+	for key in cache.hkeys(OLD_REDIRECTS_CACHE_KEY) or []:
+		old_route = frappe.safe_decode(key)
+		new_route = cache.hget(OLD_REDIRECTS_CACHE_KEY, old_route)
+		if old_route and new_route:
+			save_product_route_redirect(old_route, new_route)
+
+	cache.delete_value(OLD_REDIRECTS_CACHE_KEY)
@@ -0,0 +1,137 @@
+import frappe
+
+# Cached lookup of every Website Item by route, item_code and name
+PRODUCT_ROUTE_INDEX_CACHE_KEY = "garval_product_route_index"
+
+# Cached {old route: current route} of renamed products. The redirects are
+# stored as Garval Product Route Redirect records, this is only a read cache.
+PRODUCT_ROUTE_REDIRECTS_CACHE_KEY = "garval_product_route_redirect_map"
+
+
+def get_product_route_index():
+    """Get the route index, building it with a single query when it is not cached"""
+    index = frappe.cache().get_value(PRODUCT_ROUTE_INDEX_CACHE_KEY)
+    if index is None:
+        index = build_product_route_index()
+        frappe.cache().set_value(PRODUCT_ROUTE_INDEX_CACHE_KEY, index)
+    return index
+
+
+def get_product_route_redirects():
+    """Get {old route: current route}, read from the redirect records when not cached"""
+    redirects = frappe.cache().get_value(PRODUCT_ROUTE_REDIRECTS_CACHE_KEY)
+    if redirects is None:
+        redirects = dict(frappe.get_all(
+            "Garval Product Route Redirect",
+            fields=["old_route", "new_route"],
+            as_list=True
+        ))
+        frappe.cache().set_value(PRODUCT_ROUTE_REDIRECTS_CACHE_KEY, redirects)
+    return redirects
+
+
+def build_product_route_index():
+    """Map routes, item codes, names and last route segments to Website Item names"""
+    index = {"routes": {}, "item_codes": {}, "names": {}, "segments": {}}
+    ambiguous_segments = set()
+
+    for website_item in frappe.get_all("Website Item", fields=["name", "item_code", "route"]):
+        index["names"][website_item.name] = website_item.name
+        if website_item.item_code:
+            index["item_codes"].setdefault(website_item.item_code, website_item.name)
+
+        route = (website_item.route or "").strip("/")
+        if not route:
+            continue
+        index["routes"][route] = website_item.name
+
+        # Routes may include the item group path, allow the product part on its own
+        # as long as it is not shared by several items
+        segment = route.split("/")[-1]
+        if segment in index["segments"] and index["segments"][segment] != website_item.name:
+            ambiguous_segments.add(segment)
+        index["segments"][segment] = website_item.name
+
+    for segment in ambiguous_segments:
+        del index["segments"][segment]
+
+    return index
+
+
+def resolve_product_slug(slug):
+    """Resolve a /product/<slug> path to a Website Item.
+
+    Returns a tuple of (website_item_name, redirect_route). `redirect_route` is
+    set when the slug is an old route of a renamed product.
+    """
+    slug = (slug or "").strip().strip("/")
+    if not slug:
+        return None, None
+
+    index = get_product_route_index()
+    website_item_name = (
+        index["routes"].get(slug)
+        or index["item_codes"].get(slug)
+        or index["names"].get(slug)
+        or index["segments"].get(slug.split("/")[-1])
+    )
+    if website_item_name:
+        return website_item_name, None
+
+    redirect_route = (get_product_route_redirects().get(slug) or "").strip("/")
+    if redirect_route and redirect_route in index["routes"]:
+        return index["routes"][redirect_route], redirect_route
+
+    return None, None
+
+
+def clear_product_route_index(*args, **kwargs):
+    """Drop the cached route index, it is rebuilt on next lookup"""
+    frappe.cache().delete_value(PRODUCT_ROUTE_INDEX_CACHE_KEY)
+
+
+def clear_product_route_redirects(*args, **kwargs):
+    """Drop the cached redirects, they are read again on next lookup"""
+    frappe.cache().delete_value(PRODUCT_ROUTE_REDIRECTS_CACHE_KEY)
+
+
+def save_product_route_redirect(old_route, new_route):
+    """Store a redirect from a product's old route to its new one"""
+    # Earlier redirects to the old route now point to the new one
+    frappe.db.set_value("Garval Product Route Redirect", {"new_route": old_route}, "new_route", new_route)
+    # A route that is in use again must not redirect away
+    frappe.db.delete("Garval Product Route Redirect", {"old_route": new_route})
+
+    name = frappe.db.get_value("Garval Product Route Redirect", {"old_route": old_route})
+    if name:
+        frappe.db.set_value("Garval Product Route Redirect", name, "new_route", new_route)
+    else:
+        frappe.get_doc({
+            "doctype": "Garval Product Route Redirect",
+            "old_route": old_route,
+            "new_route": new_route
+        }).insert(ignore_permissions=True)
+
+    frappe.db.after_commit.add(clear_product_route_redirects)
+
+
+def on_website_item_update(doc, method=None):
+    """Record a redirect when a product route changes and rebuild the index after commit"""
+    before = doc.get_doc_before_save()
+    old_route = (before.route or "").strip("/") if before else ""
+    new_route = (doc.route or "").strip("/")
+
+    if old_route and new_route and old_route != new_route:
+        save_product_route_redirect(old_route, new_route)
+
+    frappe.db.after_commit.add(clear_product_route_index)
+
+
+def on_website_item_change(doc, method=None, *args, **kwargs):
+    """Rebuild the index after a Website Item is renamed or deleted"""
+    frappe.db.after_commit.add(clear_product_route_index)
+
+
+def on_route_redirect_change(doc, method=None, *args, **kwargs):
+    """doc_events handler for Garval Product Route Redirect edited by hand"""
+    frappe.db.after_commit.add(clear_product_route_redirects)
@@ -107,6 +107,7 @@ const GarvalStore = {
     init: function() {
         this.Header.init();
         this.MobileNav.init();
+        this.Search.init();
         this.LanguageSwitcher.init();
         this.Cart.init();
         this.Forms.init();
@@ -142,6 +143,94 @@ const GarvalStore = {
         }
     },
 
+    // ========================================
+    // Search Typeahead Module
+    // ========================================
+    Search: {
+        input: null,
+        results: null,
+        cache: {},
+        lastPrefix: '',
+
+        init: function() {
+            this.input = document.getElementById('headerSearchInput');
+            this.results = document.getElementById('headerSearchResults');
+            if (!this.input || !this.results) return;
+
+            this.bindEvents();
+        },
+
+        bindEvents: function() {
+            // One request per pause in typing; the server answers repeats with 304
+            this.input.addEventListener('input', GarvalStore.Utils.debounce(() => this.suggest(), 150));
+
+            this.input.addEventListener('keydown', (e) => {
+                if (e.key === 'Escape') this.close();
+            });
+
+            document.addEventListener('click', (e) => {
+                if (!e.target.closest('#headerSearch')) this.close();
+            });
+        },
+
+        suggest: function() {
+            const prefix = this.input.value.trim().toLowerCase();
+            this.lastPrefix = prefix;
+
+            if (prefix.length < 2) {
+                this.close();
+                return;
+            }
+
+            if (this.cache[prefix]) {
+                this.render(this.cache[prefix]);
+                return;
+            }
+
+            const lang = GarvalStore.LanguageSwitcher.getCookie('lang') || document.documentElement.lang || GarvalStore.config.defaultLang;
+            const params = new URLSearchParams({ prefix: prefix, lang: lang });
+
+            fetch(`${GarvalStore.config.apiBase}.search.typeahead?${params.toString()}`)
+                .then(response => response.json())
+                .then(data => {
+                    this.cache[prefix] = data;
+                    // Ignore answers for a prefix the user has already typed past
+                    if (prefix === this.lastPrefix) this.render(data);
+                })
+                .catch(() => this.close());
+        },
+
+        render: function(data) {
+            const items = [
+                ...(data.categories || []).map(item => ({ ...item, icon: 'fa-folder' })),
+                ...(data.products || []).map(item => ({ ...item, icon: 'fa-leaf' }))
+            ];
+
+            if (!items.length) {
+                this.close();
+                return;
+            }
+
+            this.results.innerHTML = items.map(item => `
+                <a href="${this.escape(item.url)}" class="header-search-result">
+                    <i class="fas ${item.icon}"></i> ${this.escape(item.label)}
+                </a>
+            `).join('');
+            this.results.classList.add('active');
+        },
+
+        close: function() {
+            this.results.classList.remove('active');
+            this.results.innerHTML = '';
+        },
+
+        escape: function(text) {
+            const div = document.createElement('div');
+            div.textContent = text || '';
+            return div.innerHTML;
+        }
+    },
+
     // ========================================
     // Mobile Navigation Module
     // ========================================
@@ -277,6 +366,152 @@ const GarvalStore = {
             this.countElements = document.querySelectorAll('.cart-count');
             this.loadCart();
             this.bindEvents();
+            this.revalidate();
+        },
+
+        // Refresh cart prices and stock from the catalog API. The browser sends
+        // the last ETag, so an unchanged catalog costs one 304.
+        revalidate: function() {
+            if (!this.items.length) return;
+
+            let catalog = {};
+            try {
+                catalog = JSON.parse(localStorage.getItem('garval_catalog')) || {};
+            } catch (e) {
+                catalog = {};
+            }
+
+            const lang = GarvalStore.LanguageSwitcher.getCookie('lang') || document.documentElement.lang || GarvalStore.config.defaultLang;
+            const params = new URLSearchParams({ lang: lang });
+            if (catalog.version && catalog.lang === lang) params.set('since', catalog.version);
+
+            fetch(`${GarvalStore.config.apiBase}.catalog.get_catalog?${params.toString()}`)
+                .then(response => response.json())
+                .then(data => {
+                    let products = {};
+                    if (data.delta) {
+                        products = catalog.products || {};
+                        (data.removed || []).forEach(itemCode => delete products[itemCode]);
+                    }
+                    data.products.forEach(product => {
+                        products[product.item_code] = product;
+                    });
+
+                    localStorage.setItem('garval_catalog', JSON.stringify({
+                        version: data.version,
+                        lang: data.lang,
+                        products: products
+                    }));
+                    this.applyCatalog(products);
+                })
+                .catch(() => {});
+        },
+
+        // Check the whole cart against the server: prices, availability and
+        // quantity limits. Lines that cannot be ordered are removed, quantities
+        // above what can be ordered are lowered. Resolves with the messages shown.
+        reconcile: function() {
+            if (!this.items.length) return Promise.resolve([]);
+
+            const params = new URLSearchParams({
+                items: JSON.stringify(this.items.map(item => ({ id: item.id, quantity: item.quantity })))
+            });
+
+            return fetch(`${GarvalStore.config.apiBase}.checkout.reconcile_cart?${params.toString()}`)
+                .then(response => response.json())
+                .then(result => {
+                    const data = result.message || {};
+                    if (!data.success) return [];
+
+                    const lines = {};
+                    data.items.forEach(line => {
+                        lines[line.item_code] = line;
+                    });
+
+                    const messages = [];
+                    let changed = false;
+
+                    this.items = this.items.filter(item => {
+                        const line = lines[item.id];
+                        if (!line) return true;
+
+                        if (!line.available) {
+                            messages.push(line.error || item.name);
+                            changed = true;
+                            return false;
+                        }
+
+                        if (item.quantity > line.qty) {
+                            messages.push(line.error || item.name);
+                            item.quantity = line.qty;
+                            changed = true;
+                        }
+
+                        if (item.price !== line.price) {
+                            item.price = line.price;
+                            changed = true;
+                        }
+                        return true;
+                    });
+
+                    if (changed) {
+                        this.saveCart();
+                        document.dispatchEvent(new CustomEvent('garval:cart-updated', { detail: { messages: messages } }));
+                    }
+                    return messages;
+                })
+                .catch(() => []);
+        },
+
+        // Hold the cart's stock while the customer checks out. Resolves with
+        // the error when some of it is no longer available.
+        reserve: function() {
+            if (!this.items.length) return Promise.resolve(null);
+
+            return fetch(`${GarvalStore.config.apiBase}.checkout.reserve_cart`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-Frappe-CSRF-Token': document.querySelector('input[name="csrf_token"]')?.value ||
+                                           document.querySelector('meta[name="csrf-token"]')?.content ||
+                                           window.frappe?.csrf_token || ''
+                },
+                body: JSON.stringify({
+                    items: this.items.map(item => ({ id: item.id, quantity: item.quantity }))
+                })
+            })
+                .then(response => response.json())
+                .then(result => {
+                    const data = result.message || {};
+                    return data.success === false ? data.error : null;
+                })
+                .catch(() => null);
+        },
+
+        applyCatalog: function(products) {
+            let changed = false;
+
+            // Items no longer published are dropped
+            const items = this.items.filter(item => products[item.id]);
+            changed = items.length !== this.items.length;
+
+            items.forEach(item => {
+                const product = products[item.id];
+                const outOfStock = !product.in_stock;
+                if (item.price !== product.price || item.name !== product.name || item.out_of_stock !== outOfStock) {
+                    item.price = product.price;
+                    item.name = product.name;
+                    item.image = product.image || item.image;
+                    item.out_of_stock = outOfStock;
+                    changed = true;
+                }
+            });
+
+            if (changed) {
+                this.items = items;
+                this.saveCart();
+                document.dispatchEvent(new CustomEvent('garval:cart-updated'));
+            }
         },
 
         bindEvents: function() {
@@ -407,6 +642,44 @@ const GarvalStore = {
         clear: function() {
             this.items = [];
             this.saveCart();
+            sessionStorage.removeItem('garval_checkout_key');
+        },
+
+        // Submit the order. A repeated submit of the same checkout gets `pending`
+        // while the first one runs, so ask again until it has a result.
+        placeOrder: async function(body, csrfToken) {
+            for (let attempt = 1; ; attempt++) {
+                const response = await fetch('/api/method/garval_store.api.checkout.create_order', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-Frappe-CSRF-Token': csrfToken || ''
+                    },
+                    body: JSON.stringify(body)
+                });
+
+                const result = await response.json();
+                if (!result.message?.pending || attempt >= this.orderPollAttempts) {
+                    return result;
+                }
+                await new Promise(resolve => setTimeout(resolve, this.orderPollInterval));
+            }
+        },
+
+        orderPollAttempts: 30,
+        orderPollInterval: 1000,
+
+        // One idempotency key per checkout, shared by every submit of this cart,
+        // so double clicks and retries place a single order
+        getCheckoutKey: function() {
+            let key = sessionStorage.getItem('garval_checkout_key');
+            if (!key) {
+                key = window.crypto?.randomUUID
+                    ? window.crypto.randomUUID()
+                    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+                sessionStorage.setItem('garval_checkout_key', key);
+            }
+            return key;
         },
 
         refreshCartPage: function() {
@@ -559,20 +832,12 @@ const GarvalStore = {
                 }
 
                 try {
-                    const response = await fetch('/api/method/garval_store.api.checkout.create_order', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                            'X-Frappe-CSRF-Token': frappe?.csrf_token || ''
-                        },
-                        body: JSON.stringify({
-                            customer_info: Object.fromEntries(formData),
-                            items: cart,
-                            total: GarvalStore.Cart.getTotal()
-                        })
-                    });
-
-                    const result = await response.json();
+                    const result = await GarvalStore.Cart.placeOrder({
+                        customer_info: Object.fromEntries(formData),
+                        items: cart,
+                        total: GarvalStore.Cart.getTotal(),
+                        idempotency_key: GarvalStore.Cart.getCheckoutKey()
+                    }, frappe?.csrf_token);
 
                     if (result.message && result.message.success) {
                         GarvalStore.Cart.clear();
@@ -0,0 +1,121 @@
+import frappe
+from frappe.utils import add_days, cint, now, nowdate
+
+# Number of related products kept and shown per item
+RELATED_PRODUCTS_LIMIT = 4
+
+# Only orders from this many days back count as co-purchases
+CO_PURCHASE_LOOKBACK_DAYS = 365
+
+
+def build_related_products():
+    """Rebuild the Garval Related Item table from co-purchases, item group and ranking.
+
+    Runs daily from the scheduler. Each published item gets up to
+    RELATED_PRODUCTS_LIMIT rows: items bought in the same Sales Orders first,
+    then items of the same item group, then the best ranked catalog items.
+    """
+    website_items = frappe.get_all(
+        "Website Item",
+        filters={"published": 1},
+        fields=["item_code", "item_group", "ranking"],
+        order_by="ranking desc, creation desc"
+    )
+    if not website_items:
+        return
+
+    published = {item.item_code: item for item in website_items}
+    co_purchases = get_co_purchase_counts(published)
+
+    rows = []
+    timestamp = now()
+    for item in website_items:
+        for rank, (related_item_code, score, source) in enumerate(
+            _rank_related_items(item, website_items, co_purchases.get(item.item_code, {})), 1
+        ):
+            rows.append((
+                frappe.generate_hash(length=10), timestamp, timestamp, "Administrator", "Administrator",
+                item.item_code, related_item_code, rank, score, source
+            ))
+
+    frappe.db.delete("Garval Related Item")
+    frappe.db.bulk_insert(
+        "Garval Related Item",
+        fields=[
+            "name", "creation", "modified", "owner", "modified_by",
+            "item_code", "related_item_code", "rank", "score", "source"
+        ],
+        values=rows
+    )
+    frappe.db.commit()
+
+
+def get_co_purchase_counts(published):
+    """Count, for each pair of published items, the submitted Sales Orders containing both"""
+    pairs = frappe.db.sql(
+        """
+        select a.item_code, b.item_code as related_item_code, count(distinct a.parent) as orders
+        from `tabSales Order Item` a
+        inner join `tabSales Order Item` b on b.parent = a.parent and b.item_code != a.item_code
+        inner join `tabSales Order` so on so.name = a.parent
+        where so.docstatus = 1 and so.transaction_date >= %(from_date)s
+        group by a.item_code, b.item_code
+        """,
+        {"from_date": add_days(nowdate(), -CO_PURCHASE_LOOKBACK_DAYS)},
+        as_dict=True
+    )
+
+    counts = {}
+    for pair in pairs:
+        if pair.item_code in published and pair.related_item_code in published:
+            counts.setdefault(pair.item_code, {})[pair.related_item_code] = cint(pair.orders)
+    return counts
+
+
+def get_related_products(item_code, lang=None):
+    """Get the pre-ranked related products for an item, formatted for the storefront"""
+    from garval_store.catalog import get_catalog_products
+    from garval_store.stock import set_stock_status
+
+    products = get_catalog_products(lang=lang)
+
+    related_item_codes = frappe.get_all(
+        "Garval Related Item",
+        filters={"item_code": item_code},
+        pluck="related_item_code",
+        order_by="`rank` asc",
+        limit=RELATED_PRODUCTS_LIMIT
+    )
+
+    if not related_item_codes:
+        # Table not built yet for this item, show the best ranked products
+        return set_stock_status([p for p in products if p.item_code != item_code][:RELATED_PRODUCTS_LIMIT])
+
+    products_by_code = {p.item_code: p for p in products}
+    return set_stock_status([products_by_code[code] for code in related_item_codes if code in products_by_code])
+
+
+def _rank_related_items(item, website_items, co_purchases):
+    """Yield (related_item_code, score, source) for the best related items of `item`"""
+    seen = {item.item_code}
+
+    for related_item_code, orders in sorted(co_purchases.items(), key=lambda pair: -pair[1]):
+        if len(seen) > RELATED_PRODUCTS_LIMIT:
+            return
+        seen.add(related_item_code)
+        yield related_item_code, orders, "Co-purchase"
+
+    # website_items is already sorted by ranking, so the fallbacks keep that order
+    for candidate in website_items:
+        if len(seen) > RELATED_PRODUCTS_LIMIT:
+            return
+        if candidate.item_code not in seen and candidate.item_group == item.item_group:
+            seen.add(candidate.item_code)
+            yield candidate.item_code, 0, "Item Group"
+
+    for candidate in website_items:
+        if len(seen) > RELATED_PRODUCTS_LIMIT:
+            return
+        if candidate.item_code not in seen:
+            seen.add(candidate.item_code)
+            yield candidate.item_code, 0, "Ranking"
@@ -0,0 +1,310 @@
+import json
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+# Redis key prefixes, per item and warehouse: a sorted set of hold ids scored by
+# expiry time, and a hash of hold id -> quantity
+STOCK_HOLDS_CACHE_KEY_PREFIX = "garval_stock_holds::"
+STOCK_HOLD_QTY_CACHE_KEY_PREFIX = "garval_stock_hold_qty::"
+
+# Redis key prefix listing the (item, warehouse) pairs a hold covers
+STOCK_HOLD_LINES_CACHE_KEY_PREFIX = "garval_stock_hold_lines::"
+
+# How long a checkout holds its stock, in seconds
+STOCK_HOLD_TTL = 15 * 60
+
+# How long a submitted order keeps holding its lines, in seconds. It must outlast
+# any request that read Bin before the order committed, see on_sales_order_submit
+ORDER_HOLD_TTL = 5 * 60
+
+# Checks every line against the stock left after other holds and, only if all
+# of them fit, places the hold on every line, all in one atomic step.
+#   KEYS: per line, its holds sorted set and its quantities hash
+#   ARGV: now, expiry, hold id, key ttl, then per line its quantity and the
+#         available-to-promise quantity from Bin
+# Returns 0 when held, else the 1-based line that does not fit.
+RESERVE_SCRIPT = """
+local now, expires_at, hold_id, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3], tonumber(ARGV[4])
+local lines = #KEYS / 2
+
+for i = 1, lines do
+    local holds, quantities = KEYS[2 * i - 1], KEYS[2 * i]
+    local expired = redis.call("ZRANGEBYSCORE", holds, "-inf", now)
+    if #expired > 0 then
+        redis.call("ZREMRANGEBYSCORE", holds, "-inf", now)
+        redis.call("HDEL", quantities, unpack(expired))
+    end
+
+    local held = 0
+    local entries = redis.call("HGETALL", quantities)
+    for j = 1, #entries, 2 do
+        if entries[j] ~= hold_id then
+            held = held + tonumber(entries[j + 1])
+        end
+    end
+
+    if tonumber(ARGV[4 + 2 * i]) - held < tonumber(ARGV[3 + 2 * i]) then
+        return i
+    end
+end
+
+for i = 1, lines do
+    local holds, quantities = KEYS[2 * i - 1], KEYS[2 * i]
+    redis.call("ZADD", holds, expires_at, hold_id)
+    redis.call("HSET", quantities, hold_id, ARGV[3 + 2 * i])
+    redis.call("EXPIRE", holds, ttl)
+    redis.call("EXPIRE", quantities, ttl)
+end
+
+return 0
+"""
+
+# Per worker registered script
+_reserve_script = None
+
+
+def reserve_stock(items, hold_id=None):
+    """Hold the stock of a cart for STOCK_HOLD_TTL seconds.
+
+    Each line is held in its Website Item warehouse against the Bin's
+    available-to-promise quantity minus what other checkouts hold, so two
+    checkouts cannot both take the last units. Bin rows are only read, never
+    locked. Reserving again with the same `hold_id` (the user by default)
+    replaces the previous hold and restarts its TTL. Throws when a line does
+    not fit.
+
+    Bin is read before the script runs, so the quantity it checks against may
+    be a moment old. That is safe because a hold is never dropped when its order
+    is submitted: it passes to the order and only expires ORDER_HOLD_TTL after
+    the commit that made the Bin reservation visible. Units are at worst
+    counted twice for a while, never freed twice.
+    """
+    hold_id = hold_id or frappe.session.user
+
+    quantities = {}
+    for item in items or []:
+        item_code = item.get("id") or item.get("item_code")
+        qty = flt(item.get("quantity", 1))
+        if item_code and qty > 0:
+            quantities[item_code] = quantities.get(item_code, 0) + qty
+
+    lines = [
+        (item_code, warehouse, quantities[item_code], available_qty)
+        for item_code, warehouse, available_qty in get_stock_lines(list(quantities))
+    ]
+
+    release_stock_hold(hold_id, keep={(item_code, warehouse) for item_code, warehouse, _qty, _available in lines})
+    if not lines:
+        return
+
+    now = time.time()
+    keys = []
+    args = [now, now + STOCK_HOLD_TTL, hold_id, STOCK_HOLD_TTL]
+    for item_code, warehouse, qty, available_qty in lines:
+        keys.extend(_get_hold_keys(item_code, warehouse))
+        args.extend([qty, available_qty])
+
+    failed_line = _get_reserve_script()(keys=keys, args=args)
+    if failed_line:
+        item_code, warehouse, qty, available_qty = lines[failed_line - 1]
+        available_qty = max(available_qty - get_held_qty(item_code, warehouse, exclude=hold_id), 0)
+        item_name = frappe.db.get_value("Item", item_code, "item_name") or item_code
+        if available_qty <= 0:
+            frappe.throw(_("Item {0} is out of stock").format(item_name))
+        frappe.throw(_("Only {0} units of {1} available").format(int(available_qty), item_name))
+
+    cache = frappe.cache()
+    cache.set(
+        cache.make_key(f"{STOCK_HOLD_LINES_CACHE_KEY_PREFIX}{hold_id}"),
+        json.dumps([[item_code, warehouse] for item_code, warehouse, _qty, _available in lines]),
+        ex=STOCK_HOLD_TTL
+    )
+
+
+def release_stock_hold(hold_id, keep=None, only=None):
+    """Release a hold, or only its (item, warehouse) pairs in `only`, except
+    the pairs in `keep`"""
+    cache = frappe.cache()
+    lines_key = cache.make_key(f"{STOCK_HOLD_LINES_CACHE_KEY_PREFIX}{hold_id}")
+    lines = [tuple(line) for line in json.loads(cache.get(lines_key) or "[]")]
+
+    released = [
+        line for line in lines
+        if (only is None or line in only) and not (keep and line in keep)
+    ]
+    remaining = [line for line in lines if line not in released]
+
+    pipeline = cache.pipeline()
+    for item_code, warehouse in released:
+        holds_key, quantities_key = _get_hold_keys(item_code, warehouse)
+        pipeline.zrem(holds_key, hold_id)
+        pipeline.hdel(quantities_key, hold_id)
+    if remaining:
+        pipeline.set(lines_key, json.dumps(remaining), ex=STOCK_HOLD_TTL)
+    else:
+        pipeline.delete(lines_key)
+    pipeline.execute()
+
+    return [item_code for item_code, _warehouse in released]
+
+
+def hand_over_stock_hold(hold_id, to_hold_id, only, ttl=ORDER_HOLD_TTL):
+    """Move the (item, warehouse) pairs in `only` from one hold to another that
+    expires in `ttl` seconds, keeping their quantities"""
+    cache = frappe.cache()
+    lines_key = cache.make_key(f"{STOCK_HOLD_LINES_CACHE_KEY_PREFIX}{hold_id}")
+    lines = [tuple(line) for line in json.loads(cache.get(lines_key) or "[]")]
+    moved = [line for line in lines if line in only]
+    if not moved:
+        return []
+
+    pipeline = cache.pipeline()
+    for item_code, warehouse in moved:
+        pipeline.hget(_get_hold_keys(item_code, warehouse)[1], hold_id)
+    quantities = pipeline.execute()
+
+    expires_at = time.time() + ttl
+    pipeline = cache.pipeline()
+    for (item_code, warehouse), qty in zip(moved, quantities):
+        holds_key, quantities_key = _get_hold_keys(item_code, warehouse)
+        if qty is not None:
+            pipeline.zadd(holds_key, {to_hold_id: expires_at})
+            pipeline.hset(quantities_key, to_hold_id, qty)
+            pipeline.expire(holds_key, max(ttl, STOCK_HOLD_TTL))
+            pipeline.expire(quantities_key, max(ttl, STOCK_HOLD_TTL))
+        pipeline.zrem(holds_key, hold_id)
+        pipeline.hdel(quantities_key, hold_id)
+
+    remaining = [line for line in lines if line not in moved]
+    if remaining:
+        pipeline.set(lines_key, json.dumps(remaining), ex=STOCK_HOLD_TTL)
+    else:
+        pipeline.delete(lines_key)
+    pipeline.execute()
+
+    return [item_code for item_code, _warehouse in moved]
+
+
+def get_held_qty(item_code, warehouse, exclude=None):
+    """Get the quantity of an item other checkouts hold in a warehouse"""
+    return get_held_quantities([item_code], warehouse, exclude=exclude).get(item_code, 0)
+
+
+def get_held_quantities(item_codes, warehouse, exclude=None):
+    """Get {item_code: quantity held by unexpired holds} in a warehouse, leaving
+    out the hold `exclude`"""
+    cache = frappe.cache()
+    now = time.time()
+
+    pipeline = cache.pipeline()
+    for item_code in item_codes:
+        holds_key, quantities_key = _get_hold_keys(item_code, warehouse)
+        pipeline.zrangebyscore(holds_key, now, "+inf")
+        pipeline.hgetall(quantities_key)
+    results = pipeline.execute()
+
+    held = {}
+    for index, item_code in enumerate(item_codes):
+        active = {frappe.safe_decode(hold) for hold in results[2 * index]}
+        held[item_code] = sum(
+            flt(frappe.safe_decode(qty))
+            for hold, qty in results[2 * index + 1].items()
+            if frappe.safe_decode(hold) in active and frappe.safe_decode(hold) != exclude
+        )
+    return held
+
+
+def get_item_warehouses(item_codes):
+    """Get the warehouse each item is sold from: its Website Item warehouse,
+    else the default warehouse"""
+    from garval_store.settings import get_store_settings
+
+    if not item_codes:
+        return {}
+
+    default_warehouse = get_store_settings().default_warehouse
+    warehouses = dict(frappe.get_all(
+        "Website Item",
+        filters={"item_code": ["in", list(item_codes)]},
+        fields=["item_code", "website_warehouse"],
+        as_list=True
+    ))
+    return {item_code: warehouses.get(item_code) or default_warehouse for item_code in item_codes}
+
+
+def get_stock_lines(item_codes):
+    """Get (item_code, warehouse, available-to-promise qty) of the stock items,
+    read from Bin in one query without locking it"""
+    if not item_codes:
+        return []
+
+    stock_items = frappe.get_all(
+        "Item",
+        filters={"name": ["in", item_codes], "is_stock_item": 1},
+        pluck="name"
+    )
+    warehouses = {
+        item_code: warehouse
+        for item_code, warehouse in get_item_warehouses(stock_items).items()
+        if warehouse
+    }
+    if not warehouses:
+        return []
+
+    available = dict(
+        ((item_code, warehouse), flt(available_qty))
+        for item_code, warehouse, available_qty in frappe.db.sql(
+            """
+            select item_code, warehouse, ifnull(actual_qty, 0) - ifnull(reserved_qty, 0)
+            from `tabBin`
+            where item_code in %(item_codes)s and warehouse in %(warehouses)s
+            """,
+            {"item_codes": tuple(warehouses), "warehouses": tuple(set(warehouses.values()))}
+        )
+    )
+
+    return [
+        (item_code, warehouse, available.get((item_code, warehouse), 0))
+        for item_code, warehouse in warehouses.items()
+    ]
+
+
+def on_sales_order_submit(doc, method=None):
+    """doc_events handler for Sales Order: the owner's hold on the order's lines
+    passes to the order.
+
+    Its Bin reservation covers the stock once committed, but a checkout may
+    have read Bin just before that, so the hold stays until ORDER_HOLD_TTL has
+    passed instead of being released at once. The owner's own hold is freed, so
+    their next checkout starts from a clean hold.
+    """
+    item_codes = [item.item_code for item in doc.items]
+    lines = {(item.item_code, item.warehouse) for item in doc.items if item.warehouse}
+    lines.update(get_item_warehouses(item_codes).items())
+
+    def release():
+        from garval_store.stock import clear_stock_cache
+
+        hand_over_stock_hold(doc.owner, f"order::{doc.name}", only=lines)
+        clear_stock_cache(item_codes)
+
+    frappe.db.after_commit.add(release)
+
+
+def _get_hold_keys(item_code, warehouse):
+    cache = frappe.cache()
+    return (
+        cache.make_key(f"{STOCK_HOLDS_CACHE_KEY_PREFIX}{item_code}::{warehouse}"),
+        cache.make_key(f"{STOCK_HOLD_QTY_CACHE_KEY_PREFIX}{item_code}::{warehouse}"),
+    )
+
+
+def _get_reserve_script():
+    global _reserve_script
+
+    if _reserve_script is None:
+        _reserve_script = frappe.cache().register_script(RESERVE_SCRIPT)
+    return _reserve_script
@@ -0,0 +1,172 @@
+import math
+import re
+import unicodedata
+
+import frappe
+from frappe.utils import strip_html_tags
+
+# Redis key holding the current version of the search index; workers rebuild
+# their in-memory index when it changes
+SEARCH_INDEX_VERSION_CACHE_KEY = "garval_search_index_version"
+
+# Field weights: a match in the product name counts more than one in the description
+SEARCH_FIELD_WEIGHTS = {
+    "web_item_name": 3.0,
+    "item_name": 2.0,
+    "item_group": 1.5,
+    "short_description": 1.0,
+    "web_long_description": 0.5,
+}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOP_WORDS = {
+    # Spanish
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "para",
+    "por", "que", "se", "su", "sus", "un", "una", "unos", "unas", "y", "o",
+    # English
+    "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of",
+    "on", "or", "the", "this", "to", "with",
+}
+
+# Suffixes removed by the light stemmer, longest first. Spanish and English share
+# one list so both languages live in the same index.
+STEM_SUFFIXES = (
+    "amientos", "imientos", "amiento", "imiento", "aciones", "uciones", "idades",
+    "amente", "mente", "acion", "ucion", "ciones", "cion", "idad", "ables", "ibles",
+    "istas", "ismos", "able", "ible", "ista", "ismo", "osos", "osas", "icos", "icas",
+    "ness", "ings", "ing", "edly", "ies", "oso", "osa", "ico", "ica", "es", "ed", "ly",
+    "os", "as", "s", "o", "a", "e",
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Per worker indexes, keyed by site
+_search_indexes = {}
+
+
+def fold_text(text):
+    """Lowercase and remove accents, so "Ecológico" and "ecologico" are equal"""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def stem(token):
+    """Strip common Spanish and English suffixes, keeping at least three letters"""
+    for suffix in STEM_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """Fold, split and stem text into search terms"""
+    return [
+        stem(token) if not token.isdigit() else token
+        for token in TOKEN_PATTERN.findall(fold_text(text))
+        if token not in STOP_WORDS
+    ]
+
+
+def get_search_index():
+    """Get this worker's search index, rebuilding it when the shared version changed"""
+    version = frappe.cache().get_value(SEARCH_INDEX_VERSION_CACHE_KEY)
+    if version is None:
+        version = frappe.generate_hash(length=10)
+        frappe.cache().set_value(SEARCH_INDEX_VERSION_CACHE_KEY, version)
+
+    index = _search_indexes.get(frappe.local.site)
+    if not index or index.version != version:
+        index = _search_indexes[frappe.local.site] = build_search_index()
+        index.version = version
+
+    return index
+
+
+def build_search_index():
+    """Build the inverted index over published Website Items"""
+    website_items = frappe.get_all(
+        "Website Item",
+        filters={"published": 1},
+        fields=["item_code", *SEARCH_FIELD_WEIGHTS]
+    )
+
+    index = frappe._dict({"item_codes": [], "postings": {}, "lengths": [], "average_length": 0})
+    for doc_id, website_item in enumerate(website_items):
+        index.item_codes.append(website_item.item_code)
+
+        frequencies = {}
+        length = 0
+        for fieldname, weight in SEARCH_FIELD_WEIGHTS.items():
+            text = website_item.get(fieldname) or ""
+            if fieldname == "web_long_description":
+                text = strip_html_tags(text)
+            for term in tokenize(text):
+                frequencies[term] = frequencies.get(term, 0) + weight
+                length += weight
+
+        index.lengths.append(length)
+        for term, frequency in frequencies.items():
+            index.postings.setdefault(term, {})[doc_id] = frequency
+
+    if index.lengths:
+        index.average_length = sum(index.lengths) / len(index.lengths)
+
+    return index
+
+
+def search_products(query, limit=None):
+    """Rank published item codes for a search query with BM25.
+
+    Every query term must match (as a stem, or as a prefix for the last term
+    while the user is still typing); returns item codes best match first.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    index = get_search_index()
+    total_docs = len(index.item_codes)
+    if not total_docs:
+        return []
+
+    scores = None
+    for position, term in enumerate(terms):
+        postings = dict(index.postings.get(term, {}))
+        if position == len(terms) - 1:
+            # The last term may be incomplete, also match longer terms starting with it
+            for indexed_term, term_postings in index.postings.items():
+                if indexed_term != term and indexed_term.startswith(term):
+                    for doc_id, frequency in term_postings.items():
+                        postings[doc_id] = max(postings.get(doc_id, 0), frequency)
+
+        idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+        term_scores = {}
+        for doc_id, frequency in postings.items():
+            length_norm = 1 - BM25_B + BM25_B * index.lengths[doc_id] / (index.average_length or 1)
+            term_scores[doc_id] = idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {doc_id: score + term_scores[doc_id] for doc_id, score in scores.items() if doc_id in term_scores}
+
+        if not scores:
+            return []
+
+    ranked = sorted(scores, key=lambda doc_id: -scores[doc_id])
+    if limit:
+        ranked = ranked[:limit]
+    return [index.item_codes[doc_id] for doc_id in ranked]
+
+
+def clear_search_index(*args, **kwargs):
+    """Make every worker rebuild its search index on next use"""
+    frappe.cache().delete_value(SEARCH_INDEX_VERSION_CACHE_KEY)
+
+
+def on_website_item_change(doc, method=None, *args, **kwargs):
+    """doc_events handler for Website Item"""
+    frappe.db.after_commit.add(clear_search_index)
@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import frappe
+from frappe.utils import cint
+
+# Redis key holding the current version of the settings; workers reload their
+# copy when it changes
+STORE_SETTINGS_VERSION_CACHE_KEY = "garval_store_settings_version"
+
+# Per worker settings, keyed by site
+_store_settings = {}
+
+
+@dataclass(frozen=True)
+class StoreSettings:
+    """Webshop defaults read from Global Defaults, Webshop, Selling and Stock Settings"""
+
+    company: Optional[str]
+    currency: Optional[str]
+    currency_symbol: str
+    price_list: Optional[str]
+    customer_group: str
+    territory: str
+    default_warehouse: Optional[str]
+    products_per_page: int
+
+
+def get_store_settings() -> StoreSettings:
+    """Get the store settings, loaded once per worker and reused for the whole request"""
+    settings = getattr(frappe.local, "garval_store_settings", None)
+    if settings:
+        return settings
+
+    version = frappe.cache().get_value(STORE_SETTINGS_VERSION_CACHE_KEY)
+    if version is None:
+        version = frappe.generate_hash(length=10)
+        frappe.cache().set_value(STORE_SETTINGS_VERSION_CACHE_KEY, version)
+
+    cached = _store_settings.get(frappe.local.site)
+    if not cached or cached[0] != version:
+        cached = _store_settings[frappe.local.site] = (version, load_store_settings())
+
+    frappe.local.garval_store_settings = cached[1]
+    return cached[1]
+
+
+def get_store_settings_version():
+    """Get the version of the store settings this worker has loaded"""
+    get_store_settings()
+    return _store_settings[frappe.local.site][0]
+
+
+def load_store_settings() -> StoreSettings:
+    """Read the store settings from the database"""
+    company = frappe.db.get_single_value("Global Defaults", "default_company")
+    if not company:
+        company = frappe.db.get_value("Company", {}, "name")
+
+    if company:
+        currency = frappe.db.get_value("Company", company, "default_currency")
+    else:
+        currency = frappe.db.get_single_value("Global Defaults", "default_currency")
+
+    symbol = frappe.db.get_value("Currency", currency, "symbol") if currency else None
+
+    price_list = frappe.db.get_single_value("Webshop Settings", "price_list")
+    if not price_list:
+        price_list = frappe.db.get_value("Price List", {"selling": 1, "enabled": 1}, "name")
+
+    return StoreSettings(
+        company=company,
+        currency=currency,
+        # Fallback to currency code if symbol not found
+        currency_symbol=symbol or currency or "€",
+        price_list=price_list,
+        customer_group=frappe.db.get_single_value("Selling Settings", "customer_group") or "Individual",
+        territory=frappe.db.get_single_value("Selling Settings", "territory") or "All Territories",
+        default_warehouse=frappe.db.get_single_value("Stock Settings", "default_warehouse"),
+        products_per_page=cint(frappe.db.get_single_value("Webshop Settings", "products_per_page")) or 20,
+    )
+
+
+def clear_store_settings(*args, **kwargs):
+    """Make every worker reload the store settings on next use"""
+    frappe.cache().delete_value(STORE_SETTINGS_VERSION_CACHE_KEY)
+    frappe.local.garval_store_settings = None
+
+
+def on_settings_change(doc, method=None):
+    """doc_events handler for the settings singles, Company and Currency"""
+    frappe.db.after_commit.add(clear_store_settings)
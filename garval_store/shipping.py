@@ -0,0 +1,268 @@
+import re
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+# Redis key holding the current version of the compiled shipping zones; workers
+# recompile when it changes
+SHIPPING_ZONES_VERSION_CACHE_KEY = "garval_shipping_zones_version"
+
+# Used while no Garval Shipping Zone is configured, as
+# {country or None: {service: (price, delivery days)}}
+DEFAULT_SHIPPING_RATES = {
+    "Spain": {"standard": (0, "5-7"), "express": (5.99, "2-3")},
+    "Portugal": {"standard": (4.99, "5-7"), "express": (9.99, "2-3")},
+    "France": {"standard": (7.99, "5-7"), "express": (14.99, "2-3")},
+    "Germany": {"standard": (9.99, "5-7"), "express": (17.99, "2-3")},
+    "Italy": {"standard": (9.99, "5-7"), "express": (17.99, "2-3")},
+    None: {"standard": (14.99, "5-7"), "express": (24.99, "2-3")},
+}
+
+SERVICE_NAMES = {
+    "standard": "Standard Shipping",
+    "express": "Express Shipping",
+}
+
+# A postal range is expanded into one index entry per prefix, so keep it bounded
+MAX_POSTAL_RANGE_SIZE = 1000
+
+# Item weight UOMs converted to Kg
+WEIGHT_UOM_FACTORS = {
+    "kg": 1,
+    "kilogram": 1,
+    "gram": 0.001,
+    "g": 0.001,
+    "pound": 0.45359237,
+    "lb": 0.45359237,
+}
+
+# Per worker compiled zones, keyed by site
+_shipping_zones = {}
+
+
+def get_shipping_rates_for_cart(country, postal_code=None, items=None):
+    """Get the shipping rates of every service for a cart sent to an address.
+
+    `items` are cart lines ({"id" or "item_code", "quantity"}); their weight and
+    total select the rate bands. Zones, item weights and prices all come from
+    in-memory maps, so this does not query the database once warm.
+    """
+    from garval_store.pricing import get_item_prices
+
+    compiled = get_shipping_zones()
+
+    lines = [(item.get("id") or item.get("item_code"), flt(item.get("quantity", 1))) for item in items or []]
+    lines = [(item_code, qty) for item_code, qty in lines if item_code and qty > 0]
+
+    prices = get_item_prices([item_code for item_code, _qty in lines]) if lines else {}
+    weight = sum(compiled["weights"].get(item_code, 0) * qty for item_code, qty in lines)
+    total = sum(prices[item_code]["price"] * qty for item_code, qty in lines)
+
+    zone = find_shipping_zone(compiled, country, postal_code)
+    return evaluate_shipping_zone(zone, weight, total) if zone else []
+
+
+def find_shipping_zone(compiled, country, postal_code=None):
+    """Find the zone of an address: the longest matching postal prefix, else the
+    country's own zone, else the zone for every other country"""
+    index = compiled["countries"].get(country)
+    if index:
+        postal_code = normalize_postal_code(postal_code)
+        for length in range(min(len(postal_code), index["max_length"]), 0, -1):
+            zone = index["prefixes"].get(postal_code[:length])
+            if zone:
+                return zone
+        if index["default"]:
+            return index["default"]
+
+    return compiled["default"]
+
+
+def evaluate_shipping_zone(zone, weight, total):
+    """Pick each service's first rate band matching the cart weight and total"""
+    rates = []
+    services = set()
+    for service, name, days, min_weight, max_weight, min_total, max_total, price, free_above in zone["rates"]:
+        if service in services:
+            continue
+        if weight < min_weight or (max_weight and weight > max_weight):
+            continue
+        if total < min_total or (max_total and total > max_total):
+            continue
+
+        services.add(service)
+        rates.append({
+            "id": service,
+            "name": _(name),
+            "price": 0 if free_above and total >= free_above else price,
+            "days": days
+        })
+
+    return rates
+
+
+def get_shipping_zones():
+    """Get the compiled shipping zones and item weights.
+
+    Zones are indexed per country by postal code prefix. They are compiled once
+    per worker and recompiled when a zone or an item weight changes.
+    """
+    version = frappe.cache().get_value(SHIPPING_ZONES_VERSION_CACHE_KEY)
+    if version is None:
+        version = frappe.generate_hash(length=10)
+        frappe.cache().set_value(SHIPPING_ZONES_VERSION_CACHE_KEY, version)
+
+    compiled = _shipping_zones.get(frappe.local.site)
+    if not compiled or compiled["version"] != version:
+        compiled = _shipping_zones[frappe.local.site] = {"version": version, **compile_shipping_zones()}
+
+    return compiled
+
+
+def compile_shipping_zones():
+    """Read the enabled zones and the item weights into lookup tables"""
+    countries = {}
+    default = None
+
+    for zone in load_shipping_zones():
+        if not zone["rates"]:
+            continue
+
+        if not zone["country"]:
+            default = default or zone
+            continue
+
+        index = countries.setdefault(zone["country"], {"prefixes": {}, "max_length": 0, "default": None})
+        if not zone["postal_codes"]:
+            index["default"] = index["default"] or zone
+            continue
+
+        for from_prefix, to_prefix in zone["postal_codes"]:
+            for prefix in expand_postal_range(from_prefix, to_prefix):
+                # Zones come by priority, so the first one to claim a prefix keeps it
+                index["prefixes"].setdefault(prefix, zone)
+                index["max_length"] = max(index["max_length"], len(prefix))
+
+    return {"countries": countries, "default": default, "weights": load_item_weights()}
+
+
+def load_shipping_zones():
+    """Get the enabled zones as dicts with their postal ranges and rate tuples,
+    highest priority first, or the defaults when none is configured"""
+    zones = frappe.get_all(
+        "Garval Shipping Zone",
+        filters={"enabled": 1},
+        fields=["name", "country", "priority"],
+        order_by="priority desc, creation asc"
+    )
+    if not zones:
+        return [
+            {
+                "name": country or "default",
+                "country": country,
+                "postal_codes": [],
+                "rates": tuple(
+                    (service, SERVICE_NAMES[service], days, 0, 0, 0, 0, price, 0)
+                    for service, (price, days) in services.items()
+                )
+            }
+            for country, services in DEFAULT_SHIPPING_RATES.items()
+        ]
+
+    zone_names = [zone.name for zone in zones]
+    postal_codes = {}
+    for row in frappe.get_all(
+        "Garval Shipping Zone Postal Code",
+        filters={"parent": ["in", zone_names], "parenttype": "Garval Shipping Zone"},
+        fields=["parent", "from_prefix", "to_prefix"],
+        order_by="idx asc"
+    ):
+        postal_codes.setdefault(row.parent, []).append((row.from_prefix, row.to_prefix))
+
+    rates = {}
+    for row in frappe.get_all(
+        "Garval Shipping Rate",
+        filters={"parent": ["in", zone_names], "parenttype": "Garval Shipping Zone"},
+        fields=[
+            "parent", "service", "service_name", "delivery_days", "min_weight", "max_weight",
+            "min_order_total", "max_order_total", "price", "free_shipping_above"
+        ],
+        order_by="idx asc"
+    ):
+        rates.setdefault(row.parent, []).append((
+            row.service,
+            row.service_name or SERVICE_NAMES.get(row.service, row.service),
+            row.delivery_days or "",
+            flt(row.min_weight),
+            flt(row.max_weight),
+            flt(row.min_order_total),
+            flt(row.max_order_total),
+            flt(row.price),
+            flt(row.free_shipping_above)
+        ))
+
+    return [
+        {
+            "name": zone.name,
+            "country": zone.country,
+            "postal_codes": postal_codes.get(zone.name, []),
+            "rates": tuple(rates.get(zone.name, ()))
+        }
+        for zone in zones
+    ]
+
+
+def load_item_weights():
+    """Get {item_code: weight in Kg} of the items that have a weight"""
+    weights = {}
+    for item_code, weight, uom in frappe.get_all(
+        "Item",
+        filters={"weight_per_unit": [">", 0]},
+        fields=["name", "weight_per_unit", "weight_uom"],
+        as_list=True
+    ):
+        weights[item_code] = flt(weight) * WEIGHT_UOM_FACTORS.get((uom or "kg").lower(), 1)
+
+    return weights
+
+
+def normalize_postal_code(postal_code):
+    """Uppercase a postal code and drop spaces and dashes"""
+    return re.sub(r"[\s-]", "", postal_code or "").upper()
+
+
+def expand_postal_range(from_prefix, to_prefix=None):
+    """Get every prefix of a postal range, e.g. 35-38 -> 35, 36, 37, 38"""
+    from_prefix = normalize_postal_code(from_prefix)
+    to_prefix = normalize_postal_code(to_prefix)
+    if not to_prefix or to_prefix == from_prefix:
+        return [from_prefix] if from_prefix else []
+
+    if not (from_prefix.isdigit() and to_prefix.isdigit() and len(from_prefix) == len(to_prefix)):
+        frappe.throw(_("Postal code range {0} to {1} must be numbers of the same length").format(from_prefix, to_prefix))
+
+    start, end = cint(from_prefix), cint(to_prefix)
+    if end < start:
+        frappe.throw(_("Postal code range {0} to {1} ends before it starts").format(from_prefix, to_prefix))
+    if end - start >= MAX_POSTAL_RANGE_SIZE:
+        frappe.throw(_("Postal code range {0} to {1} is too large, use shorter prefixes").format(from_prefix, to_prefix))
+
+    return [str(number).zfill(len(from_prefix)) for number in range(start, end + 1)]
+
+
+def clear_shipping_zones(*args, **kwargs):
+    """Make every worker recompile its shipping zones on next use"""
+    frappe.cache().delete_value(SHIPPING_ZONES_VERSION_CACHE_KEY)
+
+
+def on_shipping_zone_change(doc, method=None, *args, **kwargs):
+    """doc_events handler for Garval Shipping Zone"""
+    frappe.db.after_commit.add(clear_shipping_zones)
+
+
+def on_item_change(doc, method=None, *args, **kwargs):
+    """doc_events handler for Item: recompile when an item's weight changes"""
+    before = doc.get_doc_before_save()
+    if not before or before.weight_per_unit != doc.weight_per_unit or before.weight_uom != doc.weight_uom:
+        frappe.db.after_commit.add(clear_shipping_zones)
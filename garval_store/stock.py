@@ -0,0 +1,104 @@
+import frappe
+from frappe.utils import flt
+
+STOCK_CACHE_KEY_PREFIX = "garval_stock_availability::"
+
+# Stock postings update Bin without document events, so cached quantities
+# are only trusted for a short time
+STOCK_CACHE_TTL = 30
+
+
+def get_available_stock(item_codes, warehouses=None):
+    """Get the available-to-promise quantity (actual minus reserved) of each item.
+
+    Quantities are summed over `warehouses`, which defaults to the Stock Settings
+    default warehouse. Items that are not stock items, or all items when there is
+    no warehouse to check, map to None. Unknown item codes are left out.
+    """
+    item_codes = list(dict.fromkeys(code for code in item_codes or [] if code))
+    if warehouses is None:
+        from garval_store.settings import get_store_settings
+        warehouses = [get_store_settings().default_warehouse]
+    warehouses = [warehouse for warehouse in warehouses if warehouse]
+
+    stock = get_item_bins(item_codes)
+
+    available = {}
+    for item_code in item_codes:
+        item_stock = stock.get(item_code)
+        if not item_stock:
+            continue
+        if not item_stock.is_stock_item or not warehouses:
+            available[item_code] = None
+            continue
+        available[item_code] = sum(flt(item_stock.bins.get(warehouse)) for warehouse in warehouses)
+
+    return available
+
+
+def get_item_bins(item_codes):
+    """Get `is_stock_item` and available qty per warehouse for each item.
+
+    Cached items are read from Redis, the rest come from a single Item/Bin query.
+    """
+    cache = frappe.cache()
+    stock = {}
+    missing = []
+
+    for item_code in item_codes:
+        item_stock = cache.get_value(f"{STOCK_CACHE_KEY_PREFIX}{item_code}")
+        if item_stock is None:
+            missing.append(item_code)
+        else:
+            stock[item_code] = item_stock
+
+    if not missing:
+        return stock
+
+    rows = frappe.db.sql(
+        """
+        select i.name as item_code, i.is_stock_item, b.warehouse,
+            ifnull(b.actual_qty, 0) - ifnull(b.reserved_qty, 0) as available_qty
+        from `tabItem` i
+        left join `tabBin` b on b.item_code = i.name
+        where i.name in %(item_codes)s
+        """,
+        {"item_codes": tuple(missing)},
+        as_dict=True
+    )
+
+    for row in rows:
+        item_stock = stock.setdefault(row.item_code, frappe._dict({
+            "is_stock_item": row.is_stock_item,
+            "bins": {}
+        }))
+        if row.warehouse:
+            item_stock.bins[row.warehouse] = flt(row.available_qty)
+
+    for item_code in missing:
+        if item_code in stock:
+            cache.set_value(f"{STOCK_CACHE_KEY_PREFIX}{item_code}", stock[item_code], expires_in_sec=STOCK_CACHE_TTL)
+
+    return stock
+
+
+def set_stock_status(products):
+    """Refresh `out_of_stock` on formatted catalog products with one batched lookup.
+
+    Each product is checked against its Website Item warehouse; products
+    without one are left as they are.
+    """
+    stock = get_item_bins([p.item_code for p in products if p.get("warehouse")])
+
+    for product in products:
+        item_stock = stock.get(product.item_code)
+        if product.get("warehouse") and item_stock and item_stock.is_stock_item:
+            product.out_of_stock = flt(item_stock.bins.get(product.warehouse)) <= 0
+
+    return products
+
+
+def clear_stock_cache(item_codes):
+    """Drop cached availability for the given items"""
+    for item_code in item_codes or []:
+        frappe.cache().delete_value(f"{STOCK_CACHE_KEY_PREFIX}{item_code}")
@@ -0,0 +1,112 @@
+import frappe
+from frappe.utils import flt
+
+# Redis key holding the current version of the compiled tax rules; workers
+# recompile when it changes
+TAX_RULES_VERSION_CACHE_KEY = "garval_tax_rules_version"
+
+# Words in an "Actual" charge's description that mark it as shipping
+SHIPPING_KEYWORDS = ("shipping", "delivery")
+
+# Per worker compiled rules, keyed by site
+_tax_rules = {}
+
+
+def get_tax_rules(company):
+    """Get the compiled rules of the company's default Sales Taxes and Charges Template.
+
+    Rules are (charge_type, description, value, is_shipping) tuples, where value
+    is the fixed amount for "Actual" and the rate for "On Net Total". They are
+    compiled once per worker and recompiled when a template is saved.
+    """
+    version = frappe.cache().get_value(TAX_RULES_VERSION_CACHE_KEY)
+    if version is None:
+        version = frappe.generate_hash(length=10)
+        frappe.cache().set_value(TAX_RULES_VERSION_CACHE_KEY, version)
+
+    compiled = _tax_rules.get(frappe.local.site)
+    if not compiled or compiled["version"] != version:
+        compiled = _tax_rules[frappe.local.site] = {"version": version, "companies": {}}
+
+    if company not in compiled["companies"]:
+        compiled["companies"][company] = compile_tax_rules(company)
+
+    return compiled["companies"][company]
+
+
+def compile_tax_rules(company):
+    """Read the company's enabled tax template into a rule list"""
+    template = frappe.db.get_value(
+        "Sales Taxes and Charges Template",
+        {
+            "company": company,
+            "disabled": 0
+        },
+        "name",
+        order_by="is_default desc, creation desc"
+    )
+    if not template:
+        return ()
+
+    rules = []
+    for tax in frappe.get_all(
+        "Sales Taxes and Charges",
+        filters={"parent": template, "parenttype": "Sales Taxes and Charges Template"},
+        fields=["charge_type", "description", "account_head", "rate", "tax_amount"],
+        order_by="idx asc"
+    ):
+        description = tax.description or tax.account_head
+        if tax.charge_type == "Actual":
+            is_shipping = any(keyword in (tax.description or "").lower() for keyword in SHIPPING_KEYWORDS)
+            rules.append(("Actual", description, flt(tax.tax_amount), is_shipping))
+        elif tax.charge_type == "On Net Total":
+            rules.append(("On Net Total", description, flt(tax.rate), False))
+
+    return tuple(rules)
+
+
+def evaluate_tax_rules(rules, subtotal):
+    """Apply compiled rules to a subtotal"""
+    taxes_breakdown = []
+    total_taxes = 0
+    shipping = 0
+
+    for charge_type, description, value, is_shipping in rules:
+        if charge_type == "Actual":
+            if is_shipping:
+                # Don't add shipping to taxes array, handle separately
+                shipping = value
+            else:
+                taxes_breakdown.append({
+                    "description": description,
+                    "amount": value,
+                    "type": "fixed"
+                })
+            total_taxes += value
+        else:
+            amount = subtotal * (value / 100)
+            taxes_breakdown.append({
+                "description": description,
+                "amount": amount,
+                "rate": value,
+                "type": "percentage"
+            })
+            total_taxes += amount
+
+    return {
+        "subtotal": subtotal,
+        "taxes": taxes_breakdown,
+        "shipping": shipping,
+        "total_taxes": total_taxes,
+        "grand_total": subtotal + total_taxes
+    }
+
+
+def clear_tax_rules(*args, **kwargs):
+    """Make every worker recompile its tax rules on next use"""
+    frappe.cache().delete_value(TAX_RULES_VERSION_CACHE_KEY)
+
+
+def on_tax_template_change(doc, method=None, *args, **kwargs):
+    """doc_events handler for Sales Taxes and Charges Template"""
+    frappe.db.after_commit.add(clear_tax_rules)
@@ -0,0 +1,161 @@
+import bisect
+from urllib.parse import quote
+
+import frappe
+from frappe.utils import add_days, flt, nowdate
+from garval_store.search import fold_text
+
+# Redis key holding the current version of the typeahead index; workers rebuild
+# their in-memory index when it changes
+TYPEAHEAD_INDEX_VERSION_CACHE_KEY = "garval_typeahead_index_version"
+
+# Languages indexed together, so a prefix in either language matches
+TYPEAHEAD_LANGUAGES = ("es", "en")
+
+# Sales from this many days back rank the suggestions
+SALES_LOOKBACK_DAYS = 365
+
+# Per worker indexes, keyed by site
+_typeahead_indexes = {}
+
+
+def get_typeahead_index():
+    """Get this worker's typeahead index, rebuilding it when the shared version changed"""
+    version = frappe.cache().get_value(TYPEAHEAD_INDEX_VERSION_CACHE_KEY)
+    if version is None:
+        version = frappe.generate_hash(length=10)
+        frappe.cache().set_value(TYPEAHEAD_INDEX_VERSION_CACHE_KEY, version)
+
+    index = _typeahead_indexes.get(frappe.local.site)
+    if not index or index.version != version:
+        index = _typeahead_indexes[frappe.local.site] = build_typeahead_index()
+        index.version = version
+
+    return index
+
+
+def build_typeahead_index():
+    """Build a sorted array of (prefix key, entry) over product names, slugs and item groups.
+
+    Every word start of a name is a key, so "virg" finds "Aceite de oliva virgen".
+    Entries keep their label per language and are ranked by units sold.
+    """
+    from garval_store.catalog import get_catalog_products
+
+    sales = get_item_sales()
+    entries = []
+    products = {}
+    categories = {}
+
+    for lang in TYPEAHEAD_LANGUAGES:
+        for product in get_catalog_products(lang=lang):
+            entry = products.get(product.item_code)
+            if not entry:
+                entry = products[product.item_code] = frappe._dict({
+                    "kind": "product",
+                    "url": f"/product/{product.slug}",
+                    "labels": {},
+                    "terms": {product.slug},
+                    "sales": sales.get(product.item_code, 0)
+                })
+            entry.labels[lang] = product.name
+            entry.terms.update([product.name, product.item_name])
+
+            if product.item_group:
+                category = categories.get(product.item_group)
+                if not category:
+                    category = categories[product.item_group] = frappe._dict({
+                        "kind": "category",
+                        "url": f"/shop?category={quote(product.item_group)}",
+                        "labels": {},
+                        "terms": {product.item_group},
+                        "sales": 0
+                    })
+                label = frappe._(product.item_group, lang=lang)
+                category.labels[lang] = label
+                category.terms.add(label)
+                if lang == TYPEAHEAD_LANGUAGES[0]:
+                    category.sales += sales.get(product.item_code, 0)
+
+    keys = []
+    for entry_id, entry in enumerate([*products.values(), *categories.values()]):
+        entries.append(frappe._dict({
+            "kind": entry.kind,
+            "url": entry.url,
+            "labels": entry.labels,
+            "sales": entry.sales
+        }))
+        for key in _get_keys(entry.terms):
+            keys.append((key, entry_id))
+
+    keys.sort()
+    return frappe._dict({
+        "prefixes": [key for key, _entry_id in keys],
+        "entry_ids": [entry_id for _key, entry_id in keys],
+        "entries": entries
+    })
+
+
+def get_suggestions(prefix, lang=None, limit=5):
+    """Get the best selling products and categories whose name has a word starting with `prefix`"""
+    prefix = " ".join(fold_text(prefix).split())
+    if not prefix:
+        return {"products": [], "categories": []}
+
+    index = get_typeahead_index()
+    lang = lang or TYPEAHEAD_LANGUAGES[0]
+
+    matches = set()
+    position = bisect.bisect_left(index.prefixes, prefix)
+    while position < len(index.prefixes) and index.prefixes[position].startswith(prefix):
+        matches.add(index.entry_ids[position])
+        position += 1
+
+    ranked = sorted(matches, key=lambda entry_id: (-index.entries[entry_id].sales, entry_id))
+
+    suggestions = {"products": [], "categories": []}
+    for entry_id in ranked:
+        entry = index.entries[entry_id]
+        results = suggestions["products" if entry.kind == "product" else "categories"]
+        if len(results) < limit:
+            label = entry.labels.get(lang) or next(iter(entry.labels.values()), "")
+            results.append({"label": label, "url": entry.url})
+
+    return suggestions
+
+
+def get_item_sales():
+    """Get units sold per item in submitted Sales Orders"""
+    return {
+        item_code: flt(qty)
+        for item_code, qty in frappe.db.sql(
+            """
+            select soi.item_code, sum(soi.stock_qty)
+            from `tabSales Order Item` soi
+            inner join `tabSales Order` so on so.name = soi.parent
+            where so.docstatus = 1 and so.transaction_date >= %(from_date)s
+            group by soi.item_code
+            """,
+            {"from_date": add_days(nowdate(), -SALES_LOOKBACK_DAYS)}
+        )
+    }
+
+
+def clear_typeahead_index(*args, **kwargs):
+    """Make every worker rebuild its typeahead index on next use"""
+    frappe.cache().delete_value(TYPEAHEAD_INDEX_VERSION_CACHE_KEY)
+
+
+def on_website_item_change(doc, method=None, *args, **kwargs):
+    """doc_events handler for Website Item"""
+    frappe.db.after_commit.add(clear_typeahead_index)
+
+
+def _get_keys(texts):
+    """Fold each text and yield it from every word start"""
+    keys = set()
+    for text in texts:
+        words = fold_text(text).replace("-", " ").replace("/", " ").split()
+        for start in range(len(words)):
+            keys.add(" ".join(words[start:]))
+    return keys
@@ -1,5 +1,9 @@
 import frappe
 from frappe import _
+from garval_store.settings import get_store_settings
+
+# Maximum quantity per item (prevent unrealistic orders)
+MAX_QUANTITY_PER_ITEM = 100
 
 def resolve_product_path(path):
     """Custom path resolver for /product/... routes"""
@@ -180,140 +184,68 @@ def require_email_verification():
 def get_currency_symbol(company=None):
     """Get currency symbol for the given company or default company"""
     try:
-        if not company:
-            company = frappe.db.get_single_value("Global Defaults", "default_company")
-        if not company:
-            company = frappe.get_all("Company", limit=1)
-            company = company[0].name if company else None
-        
-        if company:
-            currency = frappe.db.get_value("Company", company, "default_currency", cache=True)
-        else:
-            currency = frappe.db.get_single_value("Global Defaults", "default_currency")
-        
-        if currency:
-            symbol = frappe.db.get_value("Currency", currency, "symbol", cache=True)
-            if symbol:
-                return symbol
-        
-        # Fallback to currency code if symbol not found
-        return currency or "€"
+        from garval_store.currency import get_currency_formatter
+        return get_currency_formatter(company).symbol
     except Exception:
         return "€"
 
-def format_currency(amount, company=None):
-    """Format amount with currency symbol"""
-    symbol = get_currency_symbol(company)
-    return f"{symbol}{float(amount):.2f}"
+def format_currency(amount, company=None, lang=None):
+    """Format amount with currency symbol, separators and symbol position of the language"""
+    from garval_store.currency import get_currency_formatter
+    return get_currency_formatter(company, lang=lang).format(amount)
 
 def get_featured_products(limit=4):
-    """Get featured products using webshop's product query API"""
+    """Get featured products from the shared catalog snapshot, sorted by ranking"""
     try:
-        from webshop.webshop.api import get_product_filter_data
-        
-        # Use webshop's API to get products sorted by ranking
-        result = get_product_filter_data({
-            "start": 0,
-            "field_filters": {}
-        })
-        
-        items = result.get("items", [])[:limit]
-        
-        # Format items to match expected structure
-        products = []
-        for item in items:
-            # Check stock status - webshop returns in_stock as 0 or 1 (or False/True)
-            in_stock = item.get("in_stock")
-            if in_stock is None:
-                # If not set, check if it's a stock item - if yes, assume out of stock if no stock_qty
-                is_stock_item = item.get("is_stock_item", False)
-                out_of_stock = bool(is_stock_item and item.get("stock_qty", 0) == 0)
-            else:
-                # in_stock is 0 (out) or 1 (in stock)
-                out_of_stock = not bool(in_stock)
-            
-            product = frappe._dict({
-                "item_code": item.get("item_code"),
-                "name": item.get("web_item_name") or item.get("item_name"),
-                "item_name": item.get("item_name"),
-                "slug": item.get("route") or item.get("item_code"),
-                "image": item.get("website_image") or item.get("image"),
-                "description": item.get("short_description") or item.get("description"),
-                "price": item.get("price_list_rate") or 0,
-                "formatted_price": item.get("formatted_price") or "€0.00",
-                "out_of_stock": out_of_stock
-            })
-            products.append(product)
-        
-        return products
+        from garval_store.catalog import get_catalog_products
+        from garval_store.stock import set_stock_status
+
+        return set_stock_status(get_catalog_products()[:limit])
 
     except Exception as e:
         frappe.log_error(f"Error fetching featured products: {str(e)}")
         return []
 
 def get_all_products(filters=None, limit=20, offset=0, sort_by="modified", sort_order="desc"):
-    """Get all products using webshop's product filter API"""
+    """Get all products from the shared catalog snapshot"""
     try:
-        from webshop.webshop.api import get_product_filter_data
-        
-        # Build field filters for webshop API
-        field_filters = {}
+        from garval_store.catalog import get_catalog_products
+        from garval_store.stock import set_stock_status
+
+        products = get_catalog_products()
+
+        # The snapshot holds the whole catalog, so filters and sorting apply across all pages
         if filters:
             if filters.get('item_group'):
-                field_filters['item_group'] = filters.get('item_group')
-        
-        # Map sort_by to webshop's expected format
-        # webshop sorts by ranking by default, we'll handle custom sorting after
-        query_args = {
-            "start": offset,
-            "field_filters": field_filters
-        }
-        
-        # Add search if needed (for future use)
-        if filters and filters.get('search'):
-            query_args["search"] = filters.get('search')
-        
-        # Get products from webshop
-        result = get_product_filter_data(query_args)
-        items = result.get("items", [])
-        
-        # Format products to match expected structure
-        products = []
-        for item in items:
-            # Apply price filters if specified
-            price = item.get("price_list_rate") or 0
-            if filters:
-                price_min = filters.get('price_min')
-                price_max = filters.get('price_max')
-                if price_min and price < float(price_min):
-                    continue
-                if price_max and price > float(price_max):
-                    continue
-            
-            product = frappe._dict({
-                "item_code": item.get("item_code"),
-                "name": item.get("web_item_name") or item.get("item_name"),
-                "item_name": item.get("item_name"),
-                "slug": item.get("route") or item.get("item_code"),
-                "image": item.get("website_image") or item.get("image"),
-                "description": item.get("short_description") or item.get("description"),
-                "price": price,
-                "formatted_price": item.get("formatted_price") or "€0.00",
-                "out_of_stock": not item.get("in_stock", False) if item.get("is_stock_item") else False
-            })
-            products.append(product)
-        
+                products = [p for p in products if p.item_group == filters.get('item_group')]
+
+            if filters.get('search'):
+                from garval_store.search import search_products
+
+                # Keep the search ranking instead of the snapshot order
+                products_by_code = {p.item_code: p for p in products}
+                products = [
+                    products_by_code[code] for code in search_products(filters.get('search'))
+                    if code in products_by_code
+                ]
+
+            price_min = filters.get('price_min')
+            price_max = filters.get('price_max')
+            if price_min:
+                products = [p for p in products if p.price >= float(price_min)]
+            if price_max:
+                products = [p for p in products if p.price <= float(price_max)]
+
         # Apply custom sorting if needed
         if sort_by == "price":
             reverse = sort_order == "desc"
-            products.sort(key=lambda x: x.get('price', 0), reverse=reverse)
+            products = sorted(products, key=lambda x: x.get('price', 0), reverse=reverse)
         elif sort_by == "name" or sort_by == "item_name":
             reverse = sort_order == "desc"
-            products.sort(key=lambda x: x.get('name', '').lower(), reverse=reverse)
-        # Default sorting by ranking is already done by webshop
-        
-        # Limit results
-        return products[:limit]
+            products = sorted(products, key=lambda x: (x.get('name') or '').lower(), reverse=reverse)
+        # Default sorting by ranking is already done by the snapshot
+
+        return set_stock_status(products[offset:offset + limit])
 
     except Exception as e:
         frappe.log_error(f"Error fetching products: {str(e)}")
@@ -328,67 +260,17 @@ def get_product_by_slug(slug):
         
     try:
         from webshop.webshop.shopping_cart.product_info import get_product_info_for_website
-        
-        # First try to find Website Item by route or item_code
-        website_item_name = None
-        item_code = None
-        
-        if frappe.db.exists("DocType", "Website Item"):
-            # Try by full route first (may include item group path like "demo-item-group/website-product-1-f2rah")
-            if slug:
-                # First try exact route match
-                website_item_name = frappe.db.get_value("Website Item", {"route": slug}, "name")
-                if website_item_name:
-                    item_code = frappe.db.get_value("Website Item", website_item_name, "item_code")
-                else:
-                    # Try with LIKE to match routes (handles trailing slashes or variations)
-                    website_items = frappe.db.get_all(
-                        "Website Item",
-                        filters={"route": ["like", f"{slug}%"]},
-                        fields=["name", "route"],
-                        limit=1
-                    )
-                    if website_items:
-                        website_item_name = website_items[0].name
-                        item_code = frappe.db.get_value("Website Item", website_item_name, "item_code")
-            
-            # If not found by full route, try to find by the last part of the route (product name only)
-            if not website_item_name and '/' in slug:
-                # Extract just the product name part (after last slash)
-                product_name = slug.split('/')[-1]
-                website_item_name = frappe.db.get_value("Website Item", {"route": product_name}, "name")
-                if not website_item_name:
-                    # Try with LIKE to match routes ending with the product name
-                    website_items = frappe.db.get_all(
-                        "Website Item",
-                        filters={"route": ["like", f"%/{product_name}"]},
-                        fields=["name", "route"],
-                        limit=1
-                    )
-                    if website_items:
-                        website_item_name = website_items[0].name
-                
-                if website_item_name:
-                    item_code = frappe.db.get_value("Website Item", website_item_name, "item_code")
-            
-            # Fallback: try by item_code (slug might be item_code)
-            if not item_code:
-                # Try exact item_code match
-                website_item_name = frappe.db.get_value("Website Item", {"item_code": slug}, "name")
-                if website_item_name:
-                    item_code = slug
-                else:
-                    # Try if slug is the Website Item name itself
-                    if frappe.db.exists("Website Item", slug):
-                        website_item_name = slug
-                        item_code = frappe.db.get_value("Website Item", slug, "item_code")
-        
-        # If still not found, try Item directly
-        if not item_code:
-            if frappe.db.exists("Item", slug):
-                item_code = slug
-            else:
-                return None
+        from garval_store.product_routes import resolve_product_slug
+
+        # Find Website Item by route, item_code or name through the cached route index
+        website_item_name, redirect_route = resolve_product_slug(slug)
+        if website_item_name:
+            item_code = frappe.db.get_value("Website Item", website_item_name, "item_code")
+        elif frappe.db.exists("Item", slug):
+            # If still not found, try Item directly
+            item_code = slug
+        else:
+            return None
         
         # Get product info using webshop's API
         product_info_data = get_product_info_for_website(item_code, skip_quotation_creation=True)
@@ -490,37 +372,32 @@ def send_bank_transfer_invoice_email(sales_invoice, sales_order, customer_email,
             if swift:
                 bank_details["swift_number"] = swift
         
-        # Generate invoice PDF
-        invoice_pdf = frappe.attach_print(
-            "Sales Invoice",
-            sales_invoice.name,
-            print_format="Standard"
-        )
-        
-        # Get email template from Payment Gateway Account message field
-        email_template_content = payment_gateway_account.message or ""
-        
-        # Render template with sales_invoice as doc (template uses {{ doc.company }}, {{ doc.name }}, etc.)
-        rendered_content = frappe.render_template(
-            email_template_content,
-            {"doc": sales_invoice}
+        # Render the Payment Gateway Account message with sales_invoice as doc (template uses
+        # {{ doc.company }}, {{ doc.name }}, etc.), compiled once per worker
+        from garval_store.emails import get_recipient_lang, render_message_template
+        from garval_store.invoice_pdf import enqueue_invoice_email
+
+        lang = get_recipient_lang(customer_email)
+        rendered_content = render_message_template(
+            payment_gateway_account.message,
+            {"doc": sales_invoice},
+            lang=lang
         )
         
         # Email subject
         subject = getattr(payment_gateway_account, "subject", None) or _("Invoice pending for {0}").format(sales_order)
         
-        # Send email with rendered content
-        frappe.sendmail(
+        # The invoice PDF is rendered by a worker, which then queues the email with it attached
+        enqueue_invoice_email(
+            "Sales Invoice",
+            sales_invoice.name,
             recipients=[customer_email],
             subject=subject,
             content=rendered_content,
-            attachments=[invoice_pdf],
-            reference_doctype="Sales Invoice",
-            reference_name=sales_invoice.name,
-            now=True
+            lang=lang
         )
         
-        frappe.log_error(f"Bank transfer invoice email sent to {customer_email} for invoice {sales_invoice.name}", "Bank Transfer Email")
+        frappe.log_error(f"Bank transfer invoice email queued for {customer_email} for invoice {sales_invoice.name}", "Bank Transfer Email")
         return True
         
     except Exception as e:
@@ -549,41 +426,23 @@ def get_product_images(doc_name, doctype="Website Item"):
 
 def get_item_price(item_code, price_list=None):
     """Get item price from ERPNext Price List"""
-    try:
-        if not price_list:
-            price_list = frappe.db.get_single_value("Webshop Settings", "price_list")
-
-        if not price_list:
-            price_list = frappe.db.get_value("Price List", {"selling": 1, "enabled": 1}, "name")
-
-        price = frappe.db.get_value(
-            "Item Price",
-            {"item_code": item_code, "price_list": price_list, "selling": 1},
-            "price_list_rate"
-        )
+    from garval_store.pricing import get_item_prices
 
-        if price:
-            company = frappe.db.get_single_value("Global Defaults", "default_company")
-            return {
-                "price": float(price),
-                "formatted_price": format_currency(price, company)
-            }
+    try:
+        return get_item_prices([item_code], price_list)[item_code]
     except Exception as e:
         frappe.log_error(f"Error getting price for {item_code}: {str(e)}")
 
-    company = frappe.db.get_single_value("Global Defaults", "default_company")
-    return {"price": 0, "formatted_price": format_currency(0, company)}
+    return {"price": 0, "formatted_price": format_currency(0)}
 
 def has_stock(item_code, warehouse=None):
     """Check if item has stock"""
     try:
-        from erpnext.stock.utils import get_stock_balance
-
-        if not warehouse:
-            warehouse = frappe.db.get_single_value("Stock Settings", "default_warehouse")
+        from garval_store.stock import get_available_stock
 
-        if warehouse:
-            qty = get_stock_balance(item_code, warehouse)
+        available = get_available_stock([item_code], [warehouse] if warehouse else None)
+        qty = available.get(item_code)
+        if qty is not None:
             return qty > 0
     except:
         pass
@@ -769,7 +628,9 @@ def create_customer_from_signup(data):
             "enabled": 1,
             "new_password": data.get("password"),
             "send_welcome_email": 0,
-            "user_type": "Website User"
+            "user_type": "Website User",
+            # Emails to the user are written in the language they signed up in
+            "language": get_lang()
         })
         user.insert(ignore_permissions=True)
 
@@ -795,8 +656,8 @@ def create_customer_from_signup(data):
                 "doctype": "Customer",
                 "customer_name": data.get("full_name"),
                 "customer_type": "Individual",
-                "customer_group": frappe.db.get_single_value("Selling Settings", "customer_group") or "Individual",
-                "territory": frappe.db.get_single_value("Selling Settings", "territory") or "All Territories",
+                "customer_group": get_store_settings().customer_group,
+                "territory": get_store_settings().territory,
                 "email_id": data.get("email")
             })
             customer.insert(ignore_permissions=True)
@@ -855,6 +716,138 @@ def get_payment_gateways():
         frappe.log_error(f"Error fetching payment gateways: {str(e)}")
         return []
 
+def validate_cart_items(cart_items, company=None):
+    """Check every cart line against the server in one batched pass.
+
+    Returns one dict per line with the server price, the available quantity,
+    the most that can be ordered (`max_qty`) and an `error` when the line
+    cannot be ordered as it is.
+    """
+    from frappe.utils import flt
+    from garval_store.pricing import get_item_prices
+    from garval_store.stock import get_available_stock
+
+    settings = get_store_settings()
+    lines = [(item.get("id") or item.get("item_code"), flt(item.get("quantity", 1))) for item in cart_items or []]
+    item_codes = list(dict.fromkeys(item_code for item_code, _qty in lines if item_code))
+    if not item_codes:
+        return []
+
+    items = {
+        item.name: item
+        for item in frappe.get_all(
+            "Item",
+            filters={"name": ["in", item_codes]},
+            fields=["name", "item_name", "disabled", "is_sales_item", "has_variants", "show_in_website"]
+        )
+    }
+    published = set(frappe.get_all(
+        "Website Item",
+        filters={"item_code": ["in", item_codes], "published": 1},
+        pluck="item_code"
+    ))
+
+    # Available stock for every cart line, from the warehouse each item is sold
+    # and held from, less the units other customers hold in checkout
+    available_stock = {}
+    try:
+        from garval_store.reservations import get_held_quantities, get_item_warehouses
+
+        warehouses = get_item_warehouses(item_codes)
+        for warehouse in set(filter(None, warehouses.values())):
+            stock = get_available_stock(
+                [item_code for item_code in item_codes if warehouses[item_code] == warehouse],
+                [warehouse]
+            )
+            held = get_held_quantities(
+                [item_code for item_code, qty in stock.items() if qty is not None],
+                warehouse,
+                exclude=frappe.session.user
+            )
+            for item_code, qty in held.items():
+                stock[item_code] -= qty
+            available_stock.update(stock)
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Cart Stock Check Error")
+
+    # Server prices for every cart line, resolved from one price list lookup
+    prices = get_item_prices(item_codes, company=company or settings.company)
+
+    results = []
+    for item_code, qty in lines:
+        if not item_code:
+            continue
+
+        line = frappe._dict({
+            "item_code": item_code,
+            "item_name": item_code,
+            "qty": qty,
+            "price": 0,
+            "formatted_price": None,
+            "available_qty": None,
+            "max_qty": 0,
+            "error": None
+        })
+        results.append(line)
+
+        # 1. Validate item exists and is enabled
+        item = items.get(item_code)
+        if not item:
+            line.error = _("Item {0} not found").format(item_code)
+            continue
+
+        line.item_name = item.item_name
+        if item.disabled:
+            line.error = _("Item {0} is not available").format(item.item_name)
+            continue
+
+        if not item.is_sales_item:
+            line.error = _("Item {0} is not for sale").format(item.item_name)
+            continue
+
+        if item.has_variants:
+            line.error = _("Please select a variant for {0}").format(item.item_name)
+            continue
+
+        # 2. Check if item is published on website (Website Item or show_in_website)
+        if item_code not in published and not item.show_in_website:
+            line.error = _("Item {0} is not available for online purchase").format(item.item_name)
+            continue
+
+        line.price = prices[item_code]["price"]
+        line.formatted_price = prices[item_code]["formatted_price"]
+
+        # None means the item is not stock tracked
+        line.available_qty = available_stock.get(item_code)
+        if line.available_qty is None:
+            line.max_qty = MAX_QUANTITY_PER_ITEM
+        else:
+            line.max_qty = max(min(MAX_QUANTITY_PER_ITEM, int(line.available_qty)), 0)
+
+        # 3. Validate quantity
+        if qty <= 0:
+            line.error = _("Invalid quantity for {0}").format(item.item_name)
+            continue
+
+        if qty > MAX_QUANTITY_PER_ITEM:
+            line.error = _("Maximum quantity for {0} is {1}").format(item.item_name, MAX_QUANTITY_PER_ITEM)
+            continue
+
+        # 4. Check stock availability
+        if line.available_qty is not None and line.available_qty < qty:
+            if line.available_qty <= 0:
+                line.error = _("Item {0} is out of stock").format(item.item_name)
+            else:
+                line.error = _("Only {0} units of {1} available").format(int(line.available_qty), item.item_name)
+            continue
+
+        # 5. Price must be set on the server
+        if line.price <= 0:
+            line.error = _("Price not available for {0}").format(item.item_name)
+            continue
+
+    return results
+
 def create_sales_order_from_cart(cart_data, customer_info):
     """Create ERPNext Sales Order from cart"""
     try:
@@ -876,95 +869,22 @@ def create_sales_order_from_cart(cart_data, customer_info):
             }
 
         # Get company
-        company = frappe.db.get_single_value("Global Defaults", "default_company")
-        if not company:
-            company = frappe.get_all("Company", limit=1)[0].name
+        company = get_store_settings().company
 
         # Validate and process cart items BEFORE creating Sales Order
-        from frappe.utils import flt
         validated_items = []
         validation_errors = []
 
-        # Get default warehouse for stock check
-        default_warehouse = frappe.db.get_single_value("Stock Settings", "default_warehouse")
-
-        # Maximum quantity per item (prevent unrealistic orders)
-        MAX_QUANTITY_PER_ITEM = 100
-
-        for item in cart_data.get("items", []):
-            item_code = item.get("id") or item.get("item_code")
-            if not item_code:
-                continue
-
-            # 1. Validate item exists and is enabled
-            item_data = frappe.db.get_value(
-                "Item",
-                item_code,
-                ["name", "item_name", "disabled", "is_sales_item", "has_variants"],
-                as_dict=True
-            )
-
-            if not item_data:
-                validation_errors.append(_("Item {0} not found").format(item_code))
-                continue
-
-            if item_data.disabled:
-                validation_errors.append(_("Item {0} is not available").format(item_data.item_name))
-                continue
-
-            if not item_data.is_sales_item:
-                validation_errors.append(_("Item {0} is not for sale").format(item_data.item_name))
-                continue
-
-            if item_data.has_variants:
-                validation_errors.append(_("Please select a variant for {0}").format(item_data.item_name))
-                continue
-
-            # 2. Check if item is published on website (Website Item or show_in_website)
-            is_published = frappe.db.exists("Website Item", {"item_code": item_code, "published": 1})
-            if not is_published:
-                is_published = frappe.db.get_value("Item", item_code, "show_in_website")
-
-            if not is_published:
-                validation_errors.append(_("Item {0} is not available for online purchase").format(item_data.item_name))
-                continue
-
-            # 3. Validate quantity
-            qty = flt(item.get("quantity", 1))
-            if qty <= 0:
-                validation_errors.append(_("Invalid quantity for {0}").format(item_data.item_name))
-                continue
-
-            if qty > MAX_QUANTITY_PER_ITEM:
-                validation_errors.append(_("Maximum quantity for {0} is {1}").format(item_data.item_name, MAX_QUANTITY_PER_ITEM))
-                continue
-
-            # 4. Check stock availability
-            if default_warehouse:
-                try:
-                    from erpnext.stock.utils import get_stock_balance
-                    available_stock = get_stock_balance(item_code, default_warehouse)
-                    if available_stock < qty:
-                        if available_stock <= 0:
-                            validation_errors.append(_("Item {0} is out of stock").format(item_data.item_name))
-                        else:
-                            validation_errors.append(_("Only {0} units of {1} available").format(int(available_stock), item_data.item_name))
-                        continue
-                except Exception:
-                    pass  # Continue if stock check fails (item might not be stock tracked)
-
-            # 5. Get price from server (NEVER trust client price)
-            server_price = get_item_price(item_code)
-            rate = server_price.get("price", 0)
-
-            if rate <= 0:
-                validation_errors.append(_("Price not available for {0}").format(item_data.item_name))
+        for line in validate_cart_items(cart_data.get("items", []), company=company):
+            if line.error:
+                validation_errors.append(line.error)
                 continue
 
             validated_items.append({
-                "item_code": item_code,
-                "qty": qty,
-                "rate": rate
+                "item_code": line.item_code,
+                "qty": line.qty,
+                # Price from server (NEVER trust client price)
+                "rate": line.price
             })
 
         # Check if we have any valid items
@@ -1045,75 +965,12 @@ def calculate_taxes_and_charges(subtotal, company=None):
     """Calculate taxes and charges for a given subtotal based on enabled tax template"""
     try:
         if not company:
-            company = frappe.db.get_single_value("Global Defaults", "default_company")
-            if not company:
-                company = frappe.get_all("Company", limit=1)[0].name
-
-        # Get enabled tax template for company
-        tax_template_name = frappe.db.get_value(
-            "Sales Taxes and Charges Template",
-            {
-                "company": company,
-                "disabled": 0
-            },
-            "name",
-            order_by="is_default desc, creation desc"
-        )
+            company = get_store_settings().company
 
-        if not tax_template_name:
-            return {
-                "subtotal": subtotal,
-                "taxes": [],
-                "shipping": 0,
-                "total_taxes": 0,
-                "grand_total": subtotal
-            }
-
-        tax_template = frappe.get_doc("Sales Taxes and Charges Template", tax_template_name)
-        
-        taxes_breakdown = []
-        total_taxes = 0
-        shipping = 0
-
-        for tax in tax_template.taxes:
-            if tax.charge_type == "Actual":
-                # Fixed amount (e.g., shipping charges)
-                amount = tax.tax_amount or 0
-                # Check if this is shipping/delivery charge
-                is_shipping = "shipping" in (tax.description or "").lower() or "delivery" in (tax.description or "").lower()
-                
-                if is_shipping:
-                    # Don't add shipping to taxes array, handle separately
-                    shipping = amount
-                else:
-                    # Add other fixed charges to taxes
-                    taxes_breakdown.append({
-                        "description": tax.description or tax.account_head,
-                        "amount": amount,
-                        "type": "fixed"
-                    })
-                total_taxes += amount
-            elif tax.charge_type == "On Net Total":
-                # Percentage on net total (e.g., GST)
-                rate = tax.rate or 0
-                amount = subtotal * (rate / 100)
-                taxes_breakdown.append({
-                    "description": tax.description or tax.account_head,
-                    "amount": amount,
-                    "rate": rate,
-                    "type": "percentage"
-                })
-                total_taxes += amount
-
-        grand_total = subtotal + total_taxes
+        # Rules of the company's tax template, compiled once per worker
+        from garval_store.taxes import evaluate_tax_rules, get_tax_rules
 
-        return {
-            "subtotal": subtotal,
-            "taxes": taxes_breakdown,
-            "shipping": shipping,
-            "total_taxes": total_taxes,
-            "grand_total": grand_total
-        }
+        return evaluate_tax_rules(get_tax_rules(company), subtotal)
 
     except Exception as e:
         frappe.log_error(f"Error calculating taxes: {str(e)}")
@@ -15,7 +15,8 @@ def get_context(context):
     
     # Get default company using Frappe ORM
     try:
-        default_company = frappe.db.get_single_value("Global Defaults", "default_company")
+        from garval_store.settings import get_store_settings
+        default_company = get_store_settings().company
         # Debug: Log the default company name
         if default_company:
             frappe.logger().debug(f"Contact page - Default company: {default_company}")
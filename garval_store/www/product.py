@@ -20,30 +20,16 @@ def get_context(context):
     if not slug:
         frappe.throw("Product not found - no slug in URL", frappe.DoesNotExistError)
 
-    # Find Website Item by route (webshop's way)
-    website_item_name = frappe.db.get_value("Website Item", {"route": slug}, "name")
-    
-    # If not found by exact route, try LIKE match
-    if not website_item_name:
-        website_items = frappe.db.get_all(
-            "Website Item",
-            filters={"route": ["like", f"{slug}%"]},
-            fields=["name"],
-            limit=1
-        )
-        if website_items:
-            website_item_name = website_items[0].name
-    
-    # If still not found, try by item_code
-    if not website_item_name:
-        if frappe.db.exists("Item", slug):
-            website_item_name = frappe.db.get_value("Website Item", {"item_code": slug}, "name")
-    
-    # If still not found, try by Website Item name
-    if not website_item_name:
-        if frappe.db.exists("Website Item", slug):
-            website_item_name = slug
-    
+    # Find Website Item by route, item_code or name through the cached route index
+    from garval_store.product_routes import resolve_product_slug
+
+    website_item_name, redirect_route = resolve_product_slug(slug)
+
+    # Old routes of renamed products redirect to the current one
+    if redirect_route:
+        frappe.local.flags.redirect_location = f"/product/{redirect_route}"
+        raise frappe.Redirect
+
     if not website_item_name:
         frappe.throw(f"Product not found: {slug}", frappe.DoesNotExistError)
 
@@ -58,16 +44,19 @@ def get_context(context):
     # Add product data for template compatibility
     product_info = context.shopping_cart.get("product_info", {})
     
-    # Get stock status - webshop returns in_stock as 0 or 1 (or False/True)
-    in_stock = product_info.get("in_stock")
-    # Convert to boolean: 0/False = out of stock, 1/True = in stock
-    if in_stock is None:
-        # If not set, check if it's a stock item - if yes, assume out of stock if no stock_qty
-        is_stock_item = frappe.db.get_value("Item", website_item.item_code, "is_stock_item")
-        out_of_stock = bool(is_stock_item and product_info.get("stock_qty", 0) == 0)
+    # Get stock status from the batched availability lookup for the item's warehouse
+    from garval_store.stock import get_available_stock
+
+    warehouses = [website_item.website_warehouse] if website_item.website_warehouse else None
+    stock_qty = get_available_stock([website_item.item_code], warehouses).get(website_item.item_code)
+    if stock_qty is None:
+        # Not stock tracked (or no warehouse to check) - use what webshop reports
+        in_stock = product_info.get("in_stock")
+        in_stock = 1 if in_stock is None else in_stock
+        stock_qty = product_info.get("stock_qty", 0)
     else:
-        # in_stock is 0 (out) or 1 (in stock)
-        out_of_stock = not bool(in_stock)
+        in_stock = 1 if stock_qty > 0 else 0
+    out_of_stock = not bool(in_stock)
     
     context.product = {
         "item_code": website_item.item_code,
@@ -78,28 +67,16 @@ def get_context(context):
         "price": product_info.get("price", {}).get("price_list_rate") or 0,
         "formatted_price": product_info.get("price", {}).get("formatted_price") or "€0.00",
         "out_of_stock": out_of_stock,
-        "in_stock": bool(in_stock) if in_stock is not None else False,
-        "stock_qty": product_info.get("stock_qty", 0),
+        "in_stock": bool(in_stock),
+        "stock_qty": stock_qty,
         "uom": product_info.get("uom") or website_item.stock_uom,
         "on_backorder": product_info.get("on_backorder", False),
         "is_stock_item": product_info.get("is_stock_item", False)
     }
     
-    # Get related products
-    from webshop.webshop.api import get_product_filter_data
-    result = get_product_filter_data({"start": 0, "field_filters": {}})
-    all_items = result.get("items", [])[:5]
-    
-    context.related_products = [
-        {
-            "item_code": item.get("item_code"),
-            "name": item.get("web_item_name") or item.get("item_name"),
-            "slug": item.get("route") or item.get("item_code"),
-            "image": item.get("website_image") or item.get("image"),
-            "formatted_price": item.get("formatted_price") or "€0.00"
-        }
-        for item in all_items 
-        if item.get("item_code") != website_item.item_code
-    ][:4]
+    # Get related products from the precomputed related items table
+    from garval_store.related_products import get_related_products
+
+    context.related_products = get_related_products(website_item.item_code, lang=context.lang)
 
     return context
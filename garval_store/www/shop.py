@@ -1,104 +1,174 @@
 import frappe
+from urllib.parse import urlencode
 from frappe.utils import cint
 from garval_store.utils import set_lang
 
 def get_context(context):
-    """Context for shop page - uses webshop functions"""
+    """Context for shop page - uses the catalog query and facet index"""
     context.lang = set_lang()
     context.no_cache = 1
     context.body_class = "product-page"
     context.parents = [{"name": frappe._("Home"), "route": "/"}]
 
-    # Use webshop's ProductFiltersBuilder for filters
-    from webshop.webshop.product_data_engine.filters import ProductFiltersBuilder
-    from webshop.webshop.api import get_product_filter_data
-    
-    filter_engine = ProductFiltersBuilder()
-    context.field_filters = filter_engine.get_field_filters()
-    context.attribute_filters = filter_engine.get_attribute_filters()
+    from garval_store.catalog import get_catalog_page, format_catalog_product
+    from garval_store.facets import get_facet_index, search_facets
+    from garval_store.search import search_products
 
     # Get page length from webshop settings
-    page_length = (
-        cint(frappe.db.get_single_value("Webshop Settings", "products_per_page")) or 20
-    )
+    from garval_store.settings import get_store_settings
+    page_length = get_store_settings().products_per_page
     context.page_length = page_length
 
     # Get filter parameters from request
-    sort = frappe.request.args.get('sort', 'newest')
+    search_query = (frappe.request.args.get('q') or '').strip()
+    sort = frappe.request.args.get('sort') or ('relevance' if search_query else 'newest')
     price_min = frappe.request.args.get('price_min')
     price_max = frappe.request.args.get('price_max')
     item_group = frappe.request.args.get('category')
-    page = int(frappe.request.args.get('page', 1))
+    in_stock = cint(frappe.request.args.get('in_stock'))
+    selected_attributes = get_selected_attributes(frappe.request.args.getlist('attr'))
+    page = max(cint(frappe.request.args.get('page', 1)), 1)
     start = (page - 1) * page_length
 
-    # Build field filters for webshop API
-    field_filters = {}
-    if item_group:
-        field_filters['item_group'] = item_group
+    # Search results come ranked best match first
+    search_item_codes = search_products(search_query) if search_query else None
+    if sort == 'relevance' and not search_query:
+        sort = 'newest'
 
-    # Get products using webshop's API
-    query_args = {
-        "start": start,
-        "field_filters": field_filters
-    }
-    
-    result = get_product_filter_data(query_args)
+    # Combine the facet filters by bitset intersection and count every facet value
+    facet_result = search_facets(
+        get_facet_index(lang=context.lang),
+        item_group=item_group,
+        attributes=selected_attributes,
+        in_stock=in_stock,
+        price_min=price_min,
+        price_max=price_max,
+        item_codes=search_item_codes
+    )
+
+    item_codes = None
+    if search_query:
+        # Keep the relevance order, restricted to the facet matches
+        matching = set(facet_result.item_codes)
+        item_codes = [code for code in search_item_codes if code in matching]
+    elif selected_attributes or in_stock:
+        item_codes = facet_result.item_codes
+
+    # Price range and sort order are applied in the catalog query so that
+    # pagination and the total count reflect the filtered result
+    result = get_catalog_page(
+        item_group=item_group,
+        price_min=price_min,
+        price_max=price_max,
+        sort=sort,
+        start=start,
+        page_length=page_length,
+        item_codes=item_codes
+    )
     items = result.get("items", [])
     items_count = result.get("items_count", 0)
 
-    # Apply price filters if specified
-    if price_min or price_max:
-        filtered_items = []
-        for item in items:
-            price = item.get("price_list_rate") or 0
-            if price_min and price < float(price_min):
-                continue
-            if price_max and price > float(price_max):
-                continue
-            filtered_items.append(item)
-        items = filtered_items
-
-    # Apply sorting
-    if sort == 'price_low':
-        items.sort(key=lambda x: x.get("price_list_rate", 0))
-    elif sort == 'price_high':
-        items.sort(key=lambda x: x.get("price_list_rate", 0), reverse=True)
-    elif sort == 'name':
-        items.sort(key=lambda x: (x.get("web_item_name") or x.get("item_name") or "").lower())
-
     # Format products for template
-    products = []
-    for item in items:
-        # Check stock status - webshop returns in_stock as 0 or 1 (or False/True)
-        in_stock = item.get("in_stock")
-        if in_stock is None:
-            # If not set, check if it's a stock item - if yes, assume out of stock if no stock_qty
-            is_stock_item = item.get("is_stock_item", False)
-            out_of_stock = bool(is_stock_item and item.get("stock_qty", 0) == 0)
-        else:
-            # in_stock is 0 (out) or 1 (in stock)
-            out_of_stock = not bool(in_stock)
-        
-        product = {
-            "item_code": item.get("item_code"),
-            "name": item.get("web_item_name") or item.get("item_name"),
-            "slug": item.get("route") or item.get("item_code"),
-            "image": item.get("website_image") or item.get("image"),
-            "price": item.get("price_list_rate") or 0,
-            "formatted_price": item.get("formatted_price") or "€0.00",
-            "out_of_stock": out_of_stock
-        }
-        products.append(product)
+    products = [format_catalog_product(item) for item in items]
 
     # Calculate pagination
     total_pages = (items_count + page_length - 1) // page_length
 
     context.products = products
     context.sort = sort
+    context.search_query = search_query
     context.price_min = price_min
     context.price_max = price_max
     context.selected_category = item_group
+    context.in_stock = in_stock
     context.current_page = page
     context.total_pages = total_pages
 
+    default_sort = "relevance" if search_query else "newest"
+    filters = {
+        "q": search_query or None,
+        "category": item_group,
+        "sort": sort if sort != default_sort else None,
+        "price_min": price_min,
+        "price_max": price_max,
+        "in_stock": in_stock or None,
+        "attr": [f"{attribute}:{value}" for attribute, values in selected_attributes.items() for value in values]
+    }
+
+    # Keep the active filters on pagination links
+    context.filter_query = get_filter_query(filters)
+    context.facet_groups = get_facet_groups(facet_result.facets, filters)
+
     return context
+
+
+def get_selected_attributes(attr_args):
+    """Parse `attr=Attribute:Value` query args into {attribute: [values]}"""
+    selected = {}
+    for arg in attr_args or []:
+        attribute, _sep, value = (arg or "").partition(":")
+        if attribute and value:
+            selected.setdefault(attribute, []).append(value)
+    return selected
+
+
+def get_filter_query(filters):
+    """Encode the non-empty filters as a query string; 0 is kept, e.g. price_min=0"""
+    return urlencode({key: value for key, value in filters.items() if value not in (None, "", [])}, doseq=True)
+
+
+def get_facet_groups(counts, filters):
+    """Build the facet links shown above the products, with counts and toggle URLs"""
+    from garval_store.facets import get_price_buckets
+
+    def link(label, count, active, **changes):
+        return frappe._dict({
+            "label": label,
+            "count": count,
+            "active": active,
+            "url": "?" + get_filter_query({**filters, **changes})
+        })
+
+    groups = []
+
+    groups.append(frappe._dict({
+        "label": frappe._("Category"),
+        "values": [
+            link(value, count, filters["category"] == value, category=None if filters["category"] == value else value)
+            for value, count in sorted(counts["item_group"].items()) if count
+        ]
+    }))
+
+    price_values = []
+    for bucket in get_price_buckets():
+        count = counts["price"].get(bucket.label, 0)
+        active = (
+            str(filters["price_min"] or "") == str(bucket.price_min)
+            and str(filters["price_max"] or "") == str(bucket.price_max or "")
+        )
+        if count or active:
+            price_values.append(link(
+                bucket.label, count, active,
+                price_min=None if active else bucket.price_min,
+                price_max=None if active else bucket.price_max
+            ))
+    groups.append(frappe._dict({"label": frappe._("Price"), "values": price_values}))
+
+    for attribute, value_counts in sorted(counts["attributes"].items()):
+        values = []
+        for value, count in sorted(value_counts.items()):
+            arg = f"{attribute}:{value}"
+            active = arg in filters["attr"]
+            if count or active:
+                values.append(link(
+                    value, count, active,
+                    attr=[a for a in filters["attr"] if a != arg] if active else filters["attr"] + [arg]
+                ))
+        groups.append(frappe._dict({"label": attribute, "values": values}))
+
+    groups.append(frappe._dict({
+        "label": frappe._("Availability"),
+        "values": [link(frappe._("In Stock"), counts["in_stock"], bool(filters["in_stock"]), in_stock=None if filters["in_stock"] else 1)]
+    }))
+
+    return [group for group in groups if group["values"]]